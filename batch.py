@@ -0,0 +1,146 @@
+# Batch job queue
+# DUTs tested back-to-back without operator prompts, read from a CSV queue
+# file or from every *.csv file of a directory (in name order). One DUT per
+# row: an SN (or MI) column and optional T0_A, R0_A, T0_B, R0_B columns,
+# empty values come from Test_Constant.
+#
+# Completed sub-tests (coil A, B, AB) and loops are checkpointed to a JSON
+# file, so an interrupted queue resumes at the coil where it stopped. Runs are
+# keyed by queue file and row, a DUT queued again in another file or row
+# (e.g. after rework) is tested again.
+#
+# Queue file example:
+#   SN,T0_A,R0_A,T0_B,R0_B
+#   2222,25,1000,26,1243
+#   MI-2223,,,,
+
+import csv
+import json
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+CALIBRATION = ('T0_A', 'R0_A', 'T0_B', 'R0_B')
+
+
+class QueueError(Exception):
+    def __init__(self, path, errors):
+        self.errors = errors
+        super().__init__(f'Invalid queue "{path}":\n' + '\n'.join(f'  {e}' for e in errors))
+
+
+@dataclass(frozen=True, slots=True)
+class Job:
+    sn: str
+    t0_a: float
+    r0_a: float
+    t0_b: float
+    r0_b: float
+    # "<queue file>:<row>" the DUT was read from
+    source: str = ''
+
+
+# "2222", "2222.0" and "MI-2222" are the same DUT
+def normalize_sn(value):
+    _value = value.strip()
+    if _value.upper().startswith('MI-'):
+        _value = _value[3:]
+    return 'MI-' + str(int(float(_value)))
+
+
+def read_queue(path, constants):
+    if os.path.isdir(path):
+        _files = sorted(os.path.join(path, _name) for _name in os.listdir(path) if _name.lower().endswith('.csv'))
+    else:
+        _files = [path]
+    _jobs = []
+    _errors = []
+    for _file in _files:
+        # utf-8-sig: Excel "CSV UTF-8" exports start with a BOM
+        with open(_file, 'r', newline='', encoding='utf-8-sig') as file:
+            for _line, _row in enumerate(csv.DictReader(file), 2):
+                _row = {_key.strip().upper(): (_value or '').strip() for _key, _value in _row.items() if _key}
+                _where = f'{os.path.basename(_file)}:{_line}'
+                _sn = _row.get('SN') or _row.get('MI')
+                if not _sn:
+                    if any(_row.values()):
+                        _errors.append(f'{_where}: missing SN')
+                    continue
+                try:
+                    _sn = normalize_sn(_sn)
+                except ValueError:
+                    _errors.append(f'{_where}: invalid SN {_sn!r}')
+                    continue
+                _calibration = {}
+                for _key in CALIBRATION:
+                    try:
+                        _calibration[_key.lower()] = float(_row[_key]) if _row.get(_key) else \
+                            getattr(constants, _key.lower())
+                    except ValueError:
+                        _errors.append(f'{_where}: {_key} expected a number, got {_row[_key]!r}')
+                if len(_calibration) == len(CALIBRATION):
+                    _jobs.append(Job(_sn, **_calibration, source=_where))
+    if _errors:
+        raise QueueError(path, _errors)
+    if not _jobs:
+        raise QueueError(path, ['no DUTs in queue'])
+    return _jobs
+
+
+# Shared by the stations, each takes the next DUT when it is free
+class JobQueue:
+    def __init__(self, jobs):
+        self._jobs = deque(jobs)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def next(self):
+        with self._lock:
+            return self._jobs.popleft() if self._jobs else None
+
+
+# Per run ("{source}#{sn}#{loop}"): result and measurements of every finished coil,
+# and whether the run is complete. Saved after every change, atomically.
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._runs = {}
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self._runs = json.load(file).get('runs', {})
+
+    @staticmethod
+    def key(source, sn, loop):
+        return f'{source}#{sn}#{loop + 1}'
+
+    def done(self, key):
+        with self._lock:
+            return self._runs.get(key, {}).get('done', False)
+
+    # {coil: {'moment': ..., 'measurements': {...}}} of an interrupted run
+    def completed(self, key):
+        with self._lock:
+            return dict(self._runs.get(key, {}).get('tests', {}))
+
+    def record(self, key, coil, moment, measurements):
+        with self._lock:
+            _run = self._runs.setdefault(key, {'done': False, 'tests': {}})
+            _run['tests'][coil] = {'moment': moment, 'measurements': measurements}
+            self._save()
+
+    def finish(self, key, overall):
+        with self._lock:
+            _run = self._runs.setdefault(key, {'tests': {}})
+            _run['done'] = True
+            _run['overall'] = overall
+            self._save()
+
+    def _save(self):
+        _temp_path = self.path + '.tmp'
+        with open(_temp_path, 'w') as file:
+            json.dump({'runs': self._runs}, file, indent=1)
+        os.replace(_temp_path, self.path)
@@ -0,0 +1,431 @@
+# Test configuration
+# Configuration.yaml is checked and converted once at startup into frozen
+# objects with typed values and derived quantities (digitize count, sample
+# interval and channel, limits per coil), so a typo stops the program with a
+# list of every problem before any instrument is energized and the test code
+# never converts strings again. "raw" keeps the YAML dict for the log and
+# the run archive.
+
+import copy
+import re
+from dataclasses import dataclass
+
+import yaml
+
+COILS = ('A', 'B', 'AB')
+BACKENDS = ('Hardware', 'Simulator')
+_DIGITIZE = re.compile(r'^\s*ACQ(?:UIRE)?:CURR(?:ENT)?(?::DC)?\s+([^,]+),([^,]+),([^,]+),(\(@\d+(?:[,:]\d+)*\))\s*$',
+                       re.IGNORECASE)
+
+
+class ConfigError(Exception):
+    def __init__(self, path, errors):
+        self.path = path
+        self.errors = errors
+        super().__init__(f'Invalid configuration "{path}":\n' + '\n'.join(f'  {e}' for e in errors))
+
+
+# DAQ970A digitize command "ACQ:CURR:DC <range>,<count>,<timer>,(@<channel>)"
+@dataclass(frozen=True, slots=True)
+class Digitize:
+    command: str
+    range: float
+    count: int
+    interval: float
+    channel: str
+
+
+@dataclass(frozen=True, slots=True)
+class EquipmentConfig:
+    instrument_retries: int
+    magnetometer_com: str
+    magnetometer_baud_rate: int
+    magnetometer_write_delay: float
+    magnetometer_ack_timeout: float
+    magnetometer_baseline: bool
+    magnetometer_baseline_max_age: float
+    magnetometer_settle_delay: float
+    magnetometer_read_timeout: float
+    magnetometer_buffer_size: int
+    power_supply_model_a: str
+    power_supply_model_b: str
+    power_supply_resource_a: str
+    power_supply_resource_b: str
+    power_supply_timeout: int
+    power_supply_voltage: str
+    power_supply_current_limit: str
+    daq_model: str
+    daq_resource_name: str
+    daq_timeout: int
+    daq_digitize_a: Digitize
+    daq_digitize_b: Digitize
+    daq_binary_transfer: bool
+    daq_binary_format: str
+
+    def power_supply_model(self, coil):
+        return self.power_supply_model_a if coil == 'A' else self.power_supply_model_b
+
+    def power_supply_resource(self, coil):
+        return self.power_supply_resource_a if coil == 'A' else self.power_supply_resource_b
+
+    def daq_digitize(self, coil):
+        return self.daq_digitize_a if coil == 'A' else self.daq_digitize_b
+
+
+@dataclass(frozen=True, slots=True)
+class ConstantConfig:
+    mi: str
+    r0_a: float
+    t0_a: float
+    r0_b: float
+    t0_b: float
+    x_distance: float
+    t_target: float
+    alpha: float
+    current_average_count: int
+    magnet_average_count: int
+    decimals: int
+
+
+@dataclass(frozen=True, slots=True)
+class LimitConfig:
+    dipole_moment_a_min: float
+    dipole_moment_b_min: float
+    dipole_moment_ab_min: float
+
+    def minimum(self, coil):
+        return {'A': self.dipole_moment_a_min, 'B': self.dipole_moment_b_min, 'AB': self.dipole_moment_ab_min}[coil]
+
+
+@dataclass(frozen=True, slots=True)
+class SoakConfig:
+    enabled: bool
+    statistics_every: int
+
+
+@dataclass(frozen=True, slots=True)
+class SettleConfig:
+    enabled: bool
+    window: int
+    relative_slope: float
+    relative_std: float
+    poll_interval: float
+    timeout: float
+    magnetometer_delay: float
+
+
+@dataclass(frozen=True, slots=True)
+class FastModeConfig:
+    enabled: bool
+    digitize_a: Digitize
+    digitize_b: Digitize
+    settle_delay: float
+    statistics: bool
+    waveform_every: int
+    waveform_on_fail: bool
+
+    def digitize(self, coil):
+        return self.digitize_a if coil == 'A' else self.digitize_b
+
+
+# 1-sigma uncertainties of the Monte Carlo moment interval: voltage, current,
+# field and R0 relative, T0 in C, ALPHA in 1/C, distance in m
+@dataclass(frozen=True, slots=True)
+class UncertaintyConfig:
+    enabled: bool
+    draws: int
+    confidence: float
+    guard_band: bool
+    voltage: float
+    current: float
+    field: float
+    r0: float
+    t0: float
+    alpha: float
+    x_distance: float
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    name: str
+    version: str
+    copyright: str
+    station_name: str
+    user_entry: bool
+    log_title: str
+    loop_number: int
+    loop_delay: float
+    log_flush_interval: float
+    debug: bool
+    backend: str
+    results_database: str
+    run_archive: bool
+    run_archive_compress: bool
+    waveform_csv: bool
+    trace: bool
+    concurrent_acquisition: bool
+    soak: SoakConfig
+    settle: SettleConfig
+    fast_mode: FastModeConfig
+    uncertainty: UncertaintyConfig
+    equipment: EquipmentConfig
+    constants: ConstantConfig
+    limits: LimitConfig
+    raw: dict
+
+
+# Collects every error instead of stopping at the first one
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.errors = []
+
+    def value(self, section, key, kind, check=None, message=None):
+        _where = f'{section}.{key}' if section else key
+        _section = self.data if section is None else self.data.get(section)
+        if not isinstance(_section, dict):
+            if f'{section}: missing section' not in self.errors:
+                self.errors.append(f'{section}: missing section')
+            return None
+        if key not in _section or _section[key] is None:
+            self.errors.append(f'{_where}: missing')
+            return None
+        _raw = _section[key]
+        try:
+            _value = _convert(_raw, kind)
+        except (TypeError, ValueError):
+            self.errors.append(f'{_where}: expected {kind.__name__}, got {_raw!r}')
+            return None
+        if check is not None and not check(_value):
+            self.errors.append(f'{_where}: {message} (got {_raw!r})')
+        return _value
+
+    def positive(self, section, key, kind):
+        return self.value(section, key, kind, lambda v: v > 0, 'must be greater than 0')
+
+    def not_negative(self, section, key, kind):
+        return self.value(section, key, kind, lambda v: v >= 0, 'must not be negative')
+
+    def digitize(self, section, key):
+        _command = self.value(section, key, str)
+        if _command is None:
+            return None
+        _match = _DIGITIZE.match(_command)
+        if not _match:
+            self.errors.append(f'{section}.{key}: expected "ACQ:CURR:DC <range>,<count>,<timer>,(@<channel>)", '
+                               f'got {_command!r}')
+            return None
+        try:
+            _digitize = Digitize(_command, float(_match.group(1)), int(float(_match.group(2))),
+                                 float(_match.group(3)), _match.group(4))
+        except ValueError:
+            self.errors.append(f'{section}.{key}: range, count and timer must be numbers, got {_command!r}')
+            return None
+        if _digitize.count <= 0 or _digitize.interval <= 0:
+            self.errors.append(f'{section}.{key}: count and timer must be greater than 0, got {_command!r}')
+        return _digitize
+
+
+def _convert(raw, kind):
+    if kind is bool:
+        if not isinstance(raw, bool):
+            raise ValueError(raw)
+        return raw
+    if kind is int:
+        # '2000' and 2000 are accepted, '2.5' and True are not
+        if isinstance(raw, bool):
+            raise ValueError(raw)
+        _value = float(raw)
+        if not _value.is_integer():
+            raise ValueError(raw)
+        return int(_value)
+    if kind is str:
+        if isinstance(raw, (dict, list)):
+            raise TypeError(raw)
+        return str(raw)
+    if kind is float and isinstance(raw, bool):
+        # float(True) is 1.0, "ALPHA: True" is a typo not a number
+        raise ValueError(raw)
+    return kind(raw)
+
+
+def parse_config(data, path='Configuration.yaml'):
+    if not isinstance(data, dict):
+        raise ConfigError(path, ['expected a mapping of settings'])
+    _r = _Reader(data)
+    _te = 'Test_Equipment'
+    _equipment = EquipmentConfig(
+        instrument_retries=_r.not_negative(_te, 'Instrument_Retries', int),
+        magnetometer_com=_r.value(_te, 'Magnetometer_COM', str),
+        magnetometer_baud_rate=_r.positive(_te, 'Magnetometer_Baud_Rate', int),
+        magnetometer_write_delay=_r.not_negative(_te, 'Magnetometer_Write_Delay', float),
+        magnetometer_ack_timeout=_r.not_negative(_te, 'Magnetometer_Ack_Timeout', float),
+        magnetometer_baseline=_r.value(_te, 'Magnetometer_Baseline', bool),
+        magnetometer_baseline_max_age=_r.not_negative(_te, 'Magnetometer_Baseline_Max_Age', float),
+        magnetometer_settle_delay=_r.not_negative(_te, 'Magnetometer_Settle_Delay', float),
+        magnetometer_read_timeout=_r.positive(_te, 'Magnetometer_Read_Timeout', float),
+        magnetometer_buffer_size=_r.positive(_te, 'Magnetometer_Buffer_Size', int),
+        power_supply_model_a=_r.value(_te, 'Power_Supply_Model_A', str),
+        power_supply_model_b=_r.value(_te, 'Power_Supply_Model_B', str),
+        power_supply_resource_a=_r.value(_te, 'Power_Supply_A_Resource_Name', str),
+        power_supply_resource_b=_r.value(_te, 'Power_Supply_B_Resource_Name', str),
+        power_supply_timeout=_r.positive(_te, 'Power_Supply_Timeout', int),
+        power_supply_voltage=_r.value(_te, 'Power_Supply_Voltage', str),
+        power_supply_current_limit=_r.value(_te, 'Power_Supply_Current_Limit', str),
+        daq_model=_r.value(_te, 'DAQ_Model', str),
+        daq_resource_name=_r.value(_te, 'DAQ_Resource_Name', str),
+        daq_timeout=_r.positive(_te, 'DAQ_Timeout', int),
+        daq_digitize_a=_r.digitize(_te, 'DAQ_Digitize_Config_A'),
+        daq_digitize_b=_r.digitize(_te, 'DAQ_Digitize_Config_B'),
+        daq_binary_transfer=_r.value(_te, 'DAQ_Binary_Transfer', bool),
+        daq_binary_format=_r.value(_te, 'DAQ_Binary_Format', str),
+    )
+    _tc = 'Test_Constant'
+    _constants = ConstantConfig(
+        mi=_r.value(_tc, 'MI', str),
+        r0_a=_r.positive(_tc, 'R0_A', float),
+        t0_a=_r.value(_tc, 'T0_A', float),
+        r0_b=_r.positive(_tc, 'R0_B', float),
+        t0_b=_r.value(_tc, 'T0_B', float),
+        x_distance=_r.positive(_tc, 'X_DISTANCE_MAGNETOMETER', float),
+        t_target=_r.value(_tc, 'T_TARGET', float),
+        alpha=_r.value(_tc, 'ALPHA', float),
+        current_average_count=_r.positive(_tc, 'CURRENT_AVERAGE_COUNT', int),
+        magnet_average_count=_r.positive(_tc, 'MAGNET_AVERAGE_COUNT', int),
+        decimals=_r.not_negative(_tc, 'Data_Decimal_Num', int),
+    )
+    _limits = LimitConfig(*(_r.value('Test_Limits', f'Dipole_Moment_{_coil}_Min', float) for _coil in COILS))
+    _soak = SoakConfig(
+        enabled=_r.value('Soak', 'Enabled', bool),
+        statistics_every=_r.not_negative('Soak', 'Statistics_Every', int),
+    )
+    _sd = 'Settle_Detection'
+    _settle = SettleConfig(
+        enabled=_r.value(_sd, 'Enabled', bool),
+        window=_r.value(_sd, 'Window', int, lambda v: v >= 2, 'must be at least 2'),
+        relative_slope=_r.positive(_sd, 'Relative_Slope', float),
+        relative_std=_r.positive(_sd, 'Relative_Std', float),
+        poll_interval=_r.not_negative(_sd, 'Poll_Interval', float),
+        timeout=_r.positive(_sd, 'Timeout', float),
+        magnetometer_delay=_r.not_negative(_sd, 'Magnetometer_Delay', float),
+    )
+    _fm = 'DAQ_Fast_Mode'
+    _fast_mode = FastModeConfig(
+        enabled=_r.value(_fm, 'Enabled', bool),
+        digitize_a=_r.digitize(_fm, 'Digitize_Config_A'),
+        digitize_b=_r.digitize(_fm, 'Digitize_Config_B'),
+        settle_delay=_r.not_negative(_fm, 'Settle_Delay', float),
+        statistics=_r.value(_fm, 'Statistics', bool),
+        waveform_every=_r.not_negative(_fm, 'Waveform_Every', int),
+        waveform_on_fail=_r.value(_fm, 'Waveform_On_Fail', bool),
+    )
+    _un = 'Uncertainty'
+    _uncertainty = UncertaintyConfig(
+        enabled=_r.value(_un, 'Enabled', bool),
+        draws=_r.positive(_un, 'Draws', int),
+        confidence=_r.value(_un, 'Confidence', float, lambda v: 0 < v < 1, 'must be between 0 and 1'),
+        guard_band=_r.value(_un, 'Guard_Band', bool),
+        voltage=_r.not_negative(_un, 'Voltage_Std', float),
+        current=_r.not_negative(_un, 'Current_Std', float),
+        field=_r.not_negative(_un, 'Field_Std', float),
+        r0=_r.not_negative(_un, 'R0_Std', float),
+        t0=_r.not_negative(_un, 'T0_Std', float),
+        alpha=_r.not_negative(_un, 'Alpha_Std', float),
+        x_distance=_r.not_negative(_un, 'X_Distance_Std', float),
+    )
+    _config = Config(
+        name=_r.value(None, 'Name', str),
+        version=_r.value(None, 'Version', str),
+        copyright=_r.value(None, 'Copyright', str),
+        station_name=str(data.get('Station_Name') or 'Station_1'),
+        user_entry=_r.value(None, 'User_Entry', bool),
+        log_title=_r.value(None, 'Log_Title', str),
+        loop_number=_r.positive(None, 'Loop_Number', int),
+        loop_delay=_r.not_negative(None, 'Loop_Delay', float),
+        log_flush_interval=_r.positive(None, 'Log_Flush_Interval', float),
+        debug=_r.value(None, 'Debug', bool),
+        backend=_r.value(None, 'Backend', str, lambda v: v in BACKENDS, f'must be one of {", ".join(BACKENDS)}'),
+        results_database=str(data.get('Results_Database') or ''),
+        run_archive=_r.value(None, 'Run_Archive', bool),
+        run_archive_compress=_r.value(None, 'Run_Archive_Compress', bool),
+        waveform_csv=_r.value(None, 'Waveform_CSV', bool),
+        trace=_r.value(None, 'Trace', bool),
+        concurrent_acquisition=_r.value(None, 'Concurrent_Acquisition', bool),
+        soak=_soak,
+        settle=_settle,
+        fast_mode=_fast_mode,
+        uncertainty=_uncertainty,
+        equipment=_equipment,
+        constants=_constants,
+        limits=_limits,
+        raw=data,
+    )
+    # Checks across settings
+    for _coil in ('A', 'B'):
+        _digitize = _equipment.daq_digitize(_coil)
+        if _digitize is not None and _constants.current_average_count is not None and \
+                _constants.current_average_count > _digitize.count:
+            _r.errors.append(f'Test_Constant.CURRENT_AVERAGE_COUNT: {_constants.current_average_count} is more than '
+                             f'the {_digitize.count} readings of DAQ_Digitize_Config_{_coil}')
+        if _digitize is not None and _equipment.daq_timeout is not None and \
+                _digitize.count * _digitize.interval * 1000 >= _equipment.daq_timeout:
+            _r.errors.append(f'Test_Equipment.DAQ_Timeout: {_equipment.daq_timeout} ms is shorter than the '
+                             f'{_digitize.count * _digitize.interval:g} s digitize of coil {_coil}')
+        if _settle.enabled and _settle.window is not None and _digitize is not None and \
+                _settle.window > _digitize.count:
+            _r.errors.append(f'Settle_Detection.Window: {_settle.window} is more than the {_digitize.count} '
+                             f'readings of DAQ_Digitize_Config_{_coil}')
+    # READ? and the settle detection DATA:REM? stream both decode binary readings as 8 byte REAL
+    if _equipment.daq_binary_transfer and _equipment.daq_binary_format is not None and \
+            not re.match(r'^\s*FORM(?:AT)?(?::DATA)?\s+REAL\s*,\s*64\s*$', _equipment.daq_binary_format, re.IGNORECASE):
+        _r.errors.append(f'Test_Equipment.DAQ_Binary_Format: expected "FORM:DATA REAL,64" with DAQ_Binary_Transfer'
+                         f'{" and Settle_Detection" if _settle.enabled else ""}, got {_equipment.daq_binary_format!r}')
+    if not isinstance(data.get('Stations') or [], list):
+        _r.errors.append('Stations: expected a list of stations')
+    if _r.errors:
+        raise ConfigError(path, _r.errors)
+    return _config
+
+
+# Load and validate a configuration file
+def load_config_file(path):
+    with open(path, 'r') as f:
+        return parse_config(yaml.safe_load(f), path)
+
+
+# One configuration per station: the "Stations" entries override Test_Equipment
+# (and Simulator) keys of the base configuration, no entries is a single station
+def station_configs(config, path='Configuration.yaml'):
+    _stations = config.raw.get('Stations') or [{'Name': 'Station_1'}]
+    _configs = []
+    for _index, _station in enumerate(_stations):
+        if not isinstance(_station, dict):
+            raise ConfigError(path, [f'Stations[{_index}]: expected a mapping, got {_station!r}'])
+        _data = copy.deepcopy(config.raw)
+        _data['Station_Name'] = _station.get('Name', f'Station_{_index + 1}')
+        for _section in ('Test_Equipment', 'Simulator'):
+            _data.setdefault(_section, {}).update(_station.get(_section) or {})
+        _configs.append(parse_config(_data, f'{path} ({_data["Station_Name"]})'))
+    # Stations run in parallel: sharing a name or an instrument would mix their
+    # outputs or drive one instrument from two threads, refuse before energizing anything
+    _errors = []
+    _names = set()
+    _resources = {}
+    for _index, _config in enumerate(_configs):
+        if _config.station_name in _names:
+            _errors.append(f'Stations: Name {_config.station_name!r} is used by more than one station')
+        _names.add(_config.station_name)
+        _equipment = _config.equipment
+        for _key, _value in (('Power_Supply_A_Resource_Name', _equipment.power_supply_resource_a),
+                             ('Power_Supply_B_Resource_Name', _equipment.power_supply_resource_b),
+                             ('DAQ_Resource_Name', _equipment.daq_resource_name),
+                             ('Magnetometer_COM', _equipment.magnetometer_com)):
+            if _value is None:
+                continue
+            _other = _resources.setdefault(_value.strip().upper(), (_index, _config.station_name, _key))
+            if _other[0] != _index:
+                _errors.append(f'Stations ({_config.station_name}): Test_Equipment.{_key} {_value!r} is already '
+                               f'used by station {_other[1]!r} ({_other[2]})')
+    if _errors:
+        raise ConfigError(path, _errors)
+    return _configs
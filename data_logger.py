@@ -0,0 +1,122 @@
+# Buffered background writer for log and waveform files
+# Callers only enqueue text, a single writer thread keeps one open handle
+# per file and flushes in batches so file I/O stays off the measurement path.
+
+import atexit
+import queue
+import threading
+import time
+
+from tracing import tracer
+
+_FLUSH = 'flush'
+_RELEASE = 'release'
+_STOP = 'stop'
+
+
+class AsyncFileWriter(threading.Thread):
+    def __init__(self, flush_interval=1.0, batch_size=1000):
+        super().__init__(name='File writer', daemon=True)
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._queue = queue.Queue()
+        self._files = {}
+        self._closed = False
+        self.error = None
+        atexit.register(self.close)
+
+    # Queue text for a file, "data" may also be a callable returning the text
+    # so expensive formatting runs on the writer thread
+    def write(self, path, data):
+        self._queue.put((path, data))
+
+    # Block until everything queued so far is written and flushed
+    def flush(self):
+        if not self.is_alive():
+            return
+        _done = threading.Event()
+        self._queue.put((_FLUSH, _done))
+        _done.wait()
+
+    # Flush and close the handles of files that will not be written again
+    def release(self, *paths):
+        self._queue.put((_RELEASE, paths))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.is_alive():
+            self._queue.put((_STOP, None))
+            self.join()
+
+    def run(self):
+        _last_flush = time.time()
+        while True:
+            try:
+                _batch = [self._queue.get(timeout=self._flush_interval)]
+            except queue.Empty:
+                self._flush_files()
+                _last_flush = time.time()
+                continue
+            while len(_batch) < self._batch_size:
+                try:
+                    _batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with tracer.span('write batch', 'file', lines=len(_batch)):
+                _stop = self._process(_batch)
+            if _stop:
+                break
+            if self._queue.empty() or time.time() - _last_flush > self._flush_interval:
+                with tracer.span('flush', 'file'):
+                    self._flush_files()
+                _last_flush = time.time()
+        for _path in list(self._files):
+            self._close_file(_path)
+
+    def _process(self, batch):
+        _stop = False
+        for _path, _data in batch:
+            if _path == _FLUSH:
+                self._flush_files()
+                _data.set()
+            elif _path == _RELEASE:
+                for _p in _data:
+                    self._close_file(_p)
+            elif _path == _STOP:
+                _stop = True
+            else:
+                self._write(_path, _data)
+        return _stop
+
+    def _write(self, path, data):
+        try:
+            if callable(data):
+                data = data()
+            _file = self._files.get(path)
+            if _file is None:
+                _file = open(path, 'a')
+                self._files[path] = _file
+            _file.write(data)
+        except OSError as e:
+            # Keep the writer alive, a bad path must not stop the other files
+            self.error = e
+            print(f"Error: Could not write {path}. {e}")
+
+    def _flush_files(self):
+        for _path, _file in self._files.items():
+            try:
+                _file.flush()
+            except OSError as e:
+                self.error = e
+                print(f"Error: Could not flush {_path}. {e}")
+
+    def _close_file(self, path):
+        _file = self._files.pop(path, None)
+        if _file is not None:
+            try:
+                _file.close()
+            except OSError as e:
+                self.error = e
+                print(f"Error: Could not close {path}. {e}")
@@ -0,0 +1,101 @@
+# Dipole moment calculation
+# Shared by the live test (station.py) and offline reprocessing (reprocess.py).
+# dipole_moment() works on scalars and, element-wise, on NumPy arrays of runs
+# or Monte Carlo draws.
+
+from dataclasses import dataclass
+
+import numpy
+
+
+# Return (R, T, moment, moment at T_TARGET) for one coil test.
+# Coil "AB" is not temperature corrected, volt/curr are placeholders there.
+def dipole_moment(coil, volt, curr, magnet, res0, t0, alpha, x_distance, t_target):
+    # Calculate average temperature T
+    _r = volt / curr
+    t = (_r / res0 - 1) / alpha + t0
+    # Calculate Dipole Moment- magnet/2 * L^3 * 10^7 [Am2]
+    m = (magnet / 2) * pow(x_distance, 3) * pow(10, 7)
+    # Calculate Target Dipole Moment
+    if coil == 'A' or coil == 'B':
+        m_target = m / (1 + alpha * (t_target - t))
+    else:
+        m_target = m
+    return _r, t, m, m_target
+
+
+# Confidence interval of m_target for one run or a batch of runs
+# moment is the nominal result, low/high the bounds of the interval
+@dataclass(frozen=True, slots=True)
+class MomentInterval:
+    moment: numpy.ndarray
+    std: numpy.ndarray
+    low: numpy.ndarray
+    high: numpy.ndarray
+
+
+# Mean and standard error of the mean of samples along the last axis
+# (one row of samples per run)
+def sample_mean(samples):
+    _samples = numpy.asarray(samples, dtype=float)
+    _count = _samples.shape[-1]
+    _mean = _samples.mean(axis=-1)
+    if _count < 2:
+        return _mean, numpy.zeros_like(_mean)
+    return _mean, _samples.std(axis=-1, ddof=1) / numpy.sqrt(_count)
+
+
+# Monte Carlo propagation of the input uncertainties through dipole_moment().
+# Every input and every entry of "sigma" (1-sigma, same units as the input:
+# volt, curr, magnet, res0, t0, alpha, x_distance) is a scalar or an array
+# of runs. All runs share one set of standard normal draws per input (common
+# random numbers), so a batch costs little more than the arithmetic, and runs
+# are processed in chunks of about CHUNK_ELEMENTS values per input so 10^6
+# draws over a whole history stay within memory.
+CHUNK_ELEMENTS = 1 << 20
+
+
+def moment_interval(coil, volt, curr, magnet, res0, t0, alpha, x_distance, t_target, sigma,
+                    draws=100000, confidence=0.95, rng=None):
+    _rng = numpy.random.default_rng() if rng is None else rng
+    _names = ('volt', 'curr', 'magnet', 'res0', 't0', 'alpha', 'x_distance')
+    _values = numpy.broadcast_arrays(*(numpy.asarray(v, dtype=float) for v in
+                                       (volt, curr, magnet, res0, t0, alpha, x_distance)),
+                                     *(numpy.asarray(sigma.get(n, 0.0), dtype=float) for n in _names))
+    _shape = _values[0].shape
+    _inputs = [v.reshape(-1) for v in _values[:len(_names)]]
+    _sigmas = [v.reshape(-1) for v in _values[len(_names):]]
+    _runs = _inputs[0].size
+    _moment = dipole_moment(coil, *_inputs[:5], _inputs[5], _inputs[6], t_target)[3]
+    _std = numpy.empty(_runs)
+    _bounds = numpy.empty((2, _runs))
+    _quantiles = ((1 - confidence) / 2, (1 + confidence) / 2)
+    # No draws for exactly known inputs
+    _normals = [_rng.standard_normal(draws) if numpy.any(_sigma) else None for _sigma in _sigmas]
+    _chunk = max(1, CHUNK_ELEMENTS // draws)
+    for _start in range(0, _runs, _chunk):
+        _slice = slice(_start, min(_start + _chunk, _runs))
+        _drawn = [_value[_slice, None] if _normal is None else _value[_slice, None] + _sigma[_slice, None] * _normal
+                  for _value, _sigma, _normal in zip(_inputs, _sigmas, _normals)]
+        _m = dipole_moment(coil, *_drawn[:5], _drawn[5], _drawn[6], t_target)[3]
+        _m = numpy.broadcast_to(_m, (_slice.stop - _slice.start, draws))
+        _std[_slice] = _m.std(axis=-1)
+        _bounds[:, _slice] = numpy.quantile(_m, _quantiles, axis=-1)
+    return MomentInterval(_moment.reshape(_shape), _std.reshape(_shape), _bounds[0].reshape(_shape),
+                          _bounds[1].reshape(_shape))
+
+
+# "sigma" of moment_interval() from the Uncertainty configuration, with the
+# standard error of the averaged current and field samples (measurement
+# noise) added in quadrature to the instrument accuracy. Coil "AB" only
+# depends on the field and the distance.
+def input_sigma(uncertainty, coil, volt, curr, magnet, res0, curr_noise=0.0, magnet_noise=0.0):
+    _sigma = {
+        'magnet': numpy.hypot(uncertainty.field * numpy.abs(magnet), magnet_noise),
+        'x_distance': uncertainty.x_distance,
+    }
+    if coil == 'A' or coil == 'B':
+        _sigma.update(volt=uncertainty.voltage * numpy.abs(volt),
+                      curr=numpy.hypot(uncertainty.current * numpy.abs(curr), curr_noise),
+                      res0=uncertainty.r0 * numpy.asarray(res0), t0=uncertainty.t0, alpha=uncertainty.alpha)
+    return _sigma
@@ -0,0 +1,221 @@
+# Instrument session pool
+# Opens every VISA resource and serial port once per process, checks the
+# model once and reuses the session across loops and DUTs. Sessions that
+# stop answering are closed and reopened instead of ending the test.
+
+import atexit
+import threading
+
+from tracing import tracer
+
+
+# pyvisa and pyserial are imported on first use so debug runs and the reporting
+# tools start without them; "instruments.VisaIOError" and
+# "instruments.SerialException" name their exception types
+def __getattr__(name):
+    if name == 'VisaIOError':
+        import pyvisa
+        return pyvisa.VisaIOError
+    if name == 'SerialException':
+        import serial
+        return serial.SerialException
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+class InstrumentError(Exception):
+    pass
+
+
+class VisaSession:
+    # Proxy for a pyvisa resource, reconnects and retries on VISA I/O errors
+    def __init__(self, pool, resource_name, model, timeout, retries):
+        self._pool = pool
+        self.resource_name = resource_name
+        self.model = model
+        self.idn = None
+        self._timeout = timeout
+        self._retries = retries
+        self._resource = None
+        self._lock = threading.RLock()
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._timeout = value
+        if self._resource is not None:
+            self._resource.timeout = value
+
+    def open(self):
+        with self._lock:
+            if self._resource is not None:
+                return
+            with tracer.span('open', 'visa', resource=self.resource_name):
+                self._open()
+
+    def _open(self):
+        _resource = self._pool.resource_manager().open_resource(self.resource_name)
+        _resource.timeout = self._timeout
+        if self.idn is None:
+            # Identify once per process, reconnects use the same resource name
+            _idn = _resource.query('*IDN?')
+            if self.model not in _idn:
+                _resource.close()
+                raise InstrumentError(f"Incorrect Model {_idn.strip()} on {self.resource_name}, "
+                                      f"expected {self.model}")
+            self.idn = _idn.strip()
+        self._resource = _resource
+
+    def reconnect(self):
+        with self._lock:
+            self.close()
+            self.open()
+
+    def close(self):
+        import pyvisa
+        with self._lock:
+            if self._resource is not None:
+                try:
+                    self._resource.close()
+                except pyvisa.VisaIOError:
+                    pass
+                self._resource = None
+
+    def _call(self, method, *args, **kwargs):
+        import pyvisa
+        _name = f'{method} {args[0]}' if args else method
+        with self._lock, tracer.span(_name, 'visa', resource=self.resource_name):
+            for _attempt in range(self._retries + 1):
+                try:
+                    self.open()
+                    return getattr(self._resource, method)(*args, **kwargs)
+                except pyvisa.VisaIOError as e:
+                    if _attempt >= self._retries:
+                        raise
+                    print(f"Lost {self.resource_name} ({e}), reconnecting")
+                    self.close()
+
+    def write(self, *args, **kwargs):
+        return self._call('write', *args, **kwargs)
+
+    def read(self, *args, **kwargs):
+        return self._call('read', *args, **kwargs)
+
+    def query(self, *args, **kwargs):
+        return self._call('query', *args, **kwargs)
+
+    def query_binary_values(self, *args, **kwargs):
+        return self._call('query_binary_values', *args, **kwargs)
+
+
+class SerialSession:
+    # Serial port opened once, "on_open" runs after every (re)connect
+    def __init__(self, port, baudrate, on_open=None, serial_factory=None):
+        self.port = port
+        self.baudrate = baudrate
+        self._on_open = on_open
+        self._serial_factory = serial_factory
+        self._serial = None
+        self._lock = threading.RLock()
+
+    @property
+    def is_open(self):
+        return self._serial is not None and self._serial.is_open
+
+    def open(self):
+        with self._lock:
+            if self.is_open:
+                return self._serial
+            with tracer.span('open', 'serial', port=self.port):
+                return self._open()
+
+    def _open(self):
+        import serial
+        self._serial = (self._serial_factory or serial.Serial)(
+            port=self.port,
+            baudrate=self.baudrate,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            bytesize=serial.EIGHTBITS,
+            timeout=2
+        )
+        if self._on_open is not None:
+            self._on_open(self._serial)
+        return self._serial
+
+    def reconnect(self):
+        with self._lock:
+            self.close()
+            return self.open()
+
+    def close(self):
+        with self._lock:
+            if self._serial is not None:
+                try:
+                    self._serial.close()
+                except OSError:
+                    pass
+                self._serial = None
+
+
+class InstrumentPool:
+    # The factories default to pyvisa/pyserial, the simulator backend replaces them
+    def __init__(self, retries=1, resource_manager_factory=None, serial_factory=None):
+        self._retries = retries
+        self._resource_manager_factory = resource_manager_factory
+        self._serial_factory = serial_factory
+        self._resource_manager_pool = None
+        self._rm = None
+        self._sessions = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close_all)
+
+    # pyvisa.ResourceManager() is a process-wide singleton whose close() ends every
+    # session opened through it, so the pools of parallel stations take it from one
+    # shared pool and leave closing it to that pool. Pools with their own factory
+    # (simulator) keep it.
+    def share_resource_manager(self, pool):
+        if self._resource_manager_factory is None:
+            self._resource_manager_pool = pool
+
+    def resource_manager(self):
+        if self._resource_manager_pool is not None:
+            return self._resource_manager_pool.resource_manager()
+        with self._lock:
+            if self._rm is None:
+                if self._resource_manager_factory is None:
+                    import pyvisa
+                    self._resource_manager_factory = pyvisa.ResourceManager
+                self._rm = self._resource_manager_factory()
+            return self._rm
+
+    # Return the session for a VISA resource, opening it on first use
+    def visa(self, resource_name, model, timeout):
+        with self._lock:
+            _session = self._sessions.get(resource_name)
+            if _session is None:
+                _session = VisaSession(self, resource_name, model, timeout, self._retries)
+                self._sessions[resource_name] = _session
+        _session.open()
+        return _session
+
+    # Return the session for a serial port, opening it on first use
+    def serial(self, port, baudrate, on_open=None):
+        with self._lock:
+            _session = self._sessions.get(port)
+            if _session is None:
+                _session = SerialSession(port, baudrate, on_open, self._serial_factory)
+                self._sessions[port] = _session
+        _session.open()
+        return _session
+
+    def close_all(self):
+        with self._lock:
+            for _session in self._sessions.values():
+                _session.close()
+            self._sessions.clear()
+            if self._rm is not None:
+                self._rm.close()
+                self._rm = None
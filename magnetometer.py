@@ -0,0 +1,209 @@
+# FVM-400 Magnetometer driver and streaming reader
+# FVM400 sends configuration commands paced by the instrument reply and
+# holds the relative-zero baseline. MagnetometerReader polls the
+# magnetometer continuously from a background thread and keeps the parsed
+# X/Y/Z readings in a ring buffer with their receive time.
+
+import threading
+import time
+from collections import deque
+
+from tracing import tracer
+
+POLL_COMMAND = b'?'
+FRAME_START = b'\x04'     # every reply is prefixed with "A\x04"
+FRAME_END = b'\r'         # and terminated with "\rD\x04"
+MAX_PENDING_BYTES = 256   # a valid frame is far shorter than this
+CHANNELS = (0, 1, 2)      # X, Y, Z
+RELATIVE_MODE = 1
+
+
+# Parse "x,y,z" payload bytes, return None for garbled frames
+def parse_sample(payload):
+    _fields = payload.split(b',')
+    if len(_fields) != 3:
+        return None
+    try:
+        _values = tuple(float(f) for f in _fields)
+    except ValueError:
+        return None
+    if any(len(f.strip()) == 0 or len(f.strip()) >= 10 for f in _fields):
+        return None
+    return _values
+
+
+class FrameParser:
+    # Incremental parser working on raw serial bytes
+    def __init__(self):
+        self._buffer = bytearray()
+        self.frames = 0
+        self.garbled = 0
+
+    def feed(self, data):
+        self._buffer += data
+        _samples = []
+        while True:
+            _end = self._buffer.find(FRAME_END)
+            if _end < 0:
+                break
+            _frame = bytes(self._buffer[:_end])
+            del self._buffer[:_end + 1]
+            self.frames += 1
+            # Drop the "D\x04A\x04A\x04 " left over from the previous frame
+            _payload = _frame.rsplit(FRAME_START, 1)[-1].strip()
+            _sample = parse_sample(_payload)
+            if _sample is None:
+                self.garbled += 1
+            else:
+                _samples.append(_sample)
+        if len(self._buffer) > MAX_PENDING_BYTES:
+            # No terminator in sight, resync on the next frame
+            self._buffer.clear()
+            self.garbled += 1
+        return _samples
+
+
+class MagnetometerReader(threading.Thread):
+    # Background reader, samples are stored as (timestamp, x, y, z) in nT
+    def __init__(self, ser, buffer_size=1000, poll_timeout=1.0, read_timeout=0.05):
+        super().__init__(name='FVM-400 reader', daemon=True)
+        self._ser = ser
+        self._poll_timeout = poll_timeout
+        self._read_timeout = read_timeout
+        self._samples = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._parser = FrameParser()
+        self.error = None
+
+    @property
+    def garbled(self):
+        return self._parser.garbled
+
+    def run(self):
+        self._ser.timeout = self._read_timeout
+        _poll_time = 0
+        _waiting_reply = False
+        try:
+            while not self._stop_event.is_set():
+                # Poll again as soon as the previous reply arrived (or was lost)
+                if not _waiting_reply or time.time() - _poll_time > self._poll_timeout:
+                    self._ser.write(POLL_COMMAND)
+                    _poll_time = time.time()
+                    _poll_perf = time.perf_counter()
+                    _waiting_reply = True
+                _data = self._ser.read(max(1, self._ser.in_waiting))
+                if not _data:
+                    continue
+                _now = time.time()
+                _frames = self._parser.frames
+                _samples = self._parser.feed(_data)
+                if self._parser.frames != _frames:
+                    # Reply complete, valid or not
+                    _waiting_reply = False
+                    tracer.record('FVM-400 ?', 'serial', _poll_perf, time.perf_counter())
+                if _samples:
+                    with self._condition:
+                        for _sample in _samples:
+                            self._samples.append((_now,) + _sample)
+                        self._condition.notify_all()
+        except OSError as e:
+            # serial.SerialException is an OSError
+            with self._condition:
+                self.error = e
+                self._condition.notify_all()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def samples_since(self, t):
+        with self._condition:
+            return [s for s in self._samples if s[0] >= t]
+
+    def latest(self, n):
+        with self._condition:
+            return list(self._samples)[-n:] if n > 0 else []
+
+    # Block until n valid samples received at or after time "since" are available
+    def wait_for_samples(self, n, since=0.0, timeout=10.0):
+        _deadline = time.time() + timeout
+        with self._condition:
+            while True:
+                _samples = [s for s in self._samples if s[0] >= since]
+                if len(_samples) >= n:
+                    return _samples[:n]
+                if self.error is not None:
+                    raise self.error
+                _remaining = _deadline - time.time()
+                if _remaining <= 0:
+                    raise TimeoutError(f"Received {len(_samples)} of {n} magnetometer samples "
+                                       f"({self._parser.garbled} garbled frames)")
+                self._condition.wait(_remaining)
+
+
+class FVM400:
+    # Command layer, the reader thread must not be running while commands are sent
+    def __init__(self, ack_timeout=0.5, fallback_delay=0.5):
+        self._ser = None
+        self._ack_timeout = ack_timeout
+        self._fallback_delay = fallback_delay
+        self.channel_modes = {}
+        self.baseline = None
+        self.baseline_time = None
+
+    def attach(self, ser):
+        self._ser = ser
+
+    # Forget the cached channel modes, e.g. after the port was lost
+    def invalidate(self):
+        self.channel_modes.clear()
+
+    # Send a command and wait for the reply instead of a fixed delay,
+    # returns False when the instrument did not answer within ack_timeout
+    @tracer.traced('serial', 'FVM-400 command')
+    def command(self, text):
+        _start = time.time()
+        _timeout = self._ser.timeout
+        self._ser.reset_input_buffer()
+        self._ser.write(text.encode())
+        self._ser.timeout = self._ack_timeout
+        try:
+            _reply = self._ser.read_until(FRAME_START)
+        finally:
+            self._ser.timeout = _timeout
+        if _reply.endswith(FRAME_START):
+            return True
+        # No reply, keep the old fixed pacing so the command is not overrun
+        tracer.sleep(max(0.0, self._fallback_delay - (time.time() - _start)), 'Magnetometer_Write_Delay')
+        return False
+
+    # Set every channel to "mode", channels already in that mode are skipped
+    def configure(self, mode=RELATIVE_MODE):
+        _sent = []
+        for _channel in CHANNELS:
+            if self.channel_modes.get(_channel) == mode:
+                continue
+            _acked_channel = self.command(f'SC{_channel}')
+            _acked_mode = self.command(f'SM{mode}')
+            self.channel_modes[_channel] = mode
+            _sent.append((_channel, _acked_channel and _acked_mode))
+        return _sent
+
+    # Average "count" readings taken with every coil off as the zero point
+    def capture_baseline(self, reader, count, timeout=10.0):
+        _samples = reader.wait_for_samples(count, since=time.time(), timeout=timeout)
+        self.baseline = tuple(sum(s[i] for s in _samples) / len(_samples) for i in (1, 2, 3))
+        self.baseline_time = time.time()
+        return self.baseline
+
+    def baseline_valid(self, max_age):
+        return self.baseline is not None and time.time() - self.baseline_time <= max_age
+
+    # Subtract the baseline from (timestamp, x, y, z) samples
+    def zero(self, samples):
+        if self.baseline is None:
+            return samples
+        _bx, _by, _bz = self.baseline
+        return [(t, x - _bx, y - _by, z - _bz) for t, x, y, z in samples]
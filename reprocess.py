@@ -0,0 +1,301 @@
+# Offline reprocessing of archived runs
+# Walks a tree of per-SN run folders, re-reads the current waveforms and
+# magnetometer readings of every run (from the .dra run archive when present,
+# otherwise from the waveform CSVs and the data log), recomputes the dipole
+# moments and pass/fail with the constants and limits of a configuration
+# file and writes a diff report against the original results. With
+# Uncertainty.Enabled every coil also gets its Monte Carlo moment interval,
+# and with Uncertainty.Guard_Band the new pass/fail is guard banded.
+#
+# Usage:
+#   python reprocess.py ROOT [--config Configuration.yaml] [--output reprocess_report.csv] [--workers N]
+
+import argparse
+import functools
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+import pandas
+
+from configuration import load_config_file
+from dipole import dipole_moment, input_sigma, moment_interval, sample_mean
+from run_archive import RunArchive
+
+COILS = ('A', 'B', 'AB')
+TEST_COILS = {'Test #1': 'A', 'Test #2': 'B', 'Test #3': 'AB'}
+# "_loop<n>" since loops starting within the same second share the date, older
+# runs have no loop number on the log and waveform files
+_LOG_NAME = re.compile(r'^(?P<sn>.+)_data_log_(?P<date>\d{8}_\d{6})(?:_loop(?P<loop>\d+))?\.txt$')
+_ARCHIVE_NAME = re.compile(r'^(?P<sn>.+)_run_(?P<date>\d{8}_\d{6})(?:_loop(?P<loop>\d+))?\.dra$')
+_CALIBRATION = re.compile(r'T0_A=([^;]+); R0_A=([^;]+); T0_B=([^;]+); R0_B=([^;\s]+)')
+_VOLTAGE = re.compile(r'^Coil_(A|B) voltage: ([-+0-9.Ee]+)')
+# DAQ970A fast mode: "Coil_A current statistics: mean: <v>; std: <v>; ..."
+_CURRENT_STATISTICS = re.compile(r'^Coil_(A|B) current statistics: (.*)$')
+_MOMENT = re.compile(r'^Moment: [^;]+; Moment Target: ([-+0-9.Ee]+)')
+_LIMIT = re.compile(r"'Dipole_Moment_(A|B|AB)_Min': '?([-+0-9.Ee]+)")
+_DECIMALS = re.compile(r"'Data_Decimal_Num': '?(\d+)")
+
+
+# Constants and limits used for the recalculation, from a validated configuration
+def load_parameters(config):
+    return {
+        'alpha': config.constants.alpha,
+        'x_distance': config.constants.x_distance,
+        't_target': config.constants.t_target,
+        'current_average_count': config.constants.current_average_count,
+        'magnet_average_count': config.constants.magnet_average_count,
+        'decimals': config.constants.decimals,
+        'limits': {coil: config.limits.minimum(coil) for coil in COILS},
+        'uncertainty': config.uncertainty,
+    }
+
+
+# Every "{sn}_data_log_{date}_loop{n}.txt" below root is one run with the archive
+# and waveforms of the same loop. A log without loop number is one run, or one
+# run per archive when several loops finished within the same second
+def find_runs(root):
+    _runs = []
+    for _dir, _dirs, _files in os.walk(root):
+        _names = set(_files)
+        _archives = {}
+        for _file in _files:
+            _match = _ARCHIVE_NAME.match(_file)
+            if _match:
+                _loop = int(_match.group('loop')) if _match.group('loop') else None
+                _archives.setdefault((_match.group('sn'), _match.group('date')), []).append((_loop, _file))
+        for _file in _files:
+            _match = _LOG_NAME.match(_file)
+            if not _match:
+                continue
+            _sn, _date = _match.group('sn'), _match.group('date')
+            if _match.group('loop'):
+                _loop = int(_match.group('loop'))
+                _archive = f'{_sn}_run_{_date}_loop{_loop}.dra'
+                _loop_archives = [(_loop, _archive if _archive in _names else None)]
+                _suffix = f'_loop{_loop}'
+            else:
+                _loop_archives = sorted(_archives.get((_sn, _date)) or [(None, None)], key=lambda a: a[0] or 0)
+                _suffix = ''
+            for _loop, _archive in _loop_archives:
+                _run = {'sn': _sn, 'date': _date, 'loop': _loop, 'log': os.path.join(_dir, _file),
+                        'archive': os.path.join(_dir, _archive) if _archive else None, 'waveforms': {}}
+                for _coil in ('A', 'B'):
+                    _waveform = f'{_sn}_coil_{_coil}_current_waveform{_date}{_suffix}.csv'
+                    if _waveform in _names:
+                        _run['waveforms'][_coil] = os.path.join(_dir, _waveform)
+                _runs.append(_run)
+    return sorted(_runs, key=lambda r: (r['sn'], r['date'], r['loop'] or 0))
+
+
+# Pull calibration, voltages, magnetometer readings, original moments and limits from a data log
+def parse_log(text):
+    _run = {'calibration': None, 'voltage': {}, 'current_statistics': {}, 'readings': {c: [] for c in COILS},
+            'baseline': {}, 'moments': {}, 'limits': {}, 'decimals': None}
+    _coil = None
+    for _line in text.splitlines():
+        _data = _line.split('\t', 1)[-1].strip()
+        if _data in TEST_COILS:
+            _coil = TEST_COILS[_data]
+            continue
+        if _run['calibration'] is None:
+            _match = _CALIBRATION.search(_data)
+            if _match:
+                _t0_a, _r0_a, _t0_b, _r0_b = (float(v) for v in _match.groups())
+                _run['calibration'] = {'T0_A': _t0_a, 'R0_A': _r0_a, 'T0_B': _t0_b, 'R0_B': _r0_b}
+                continue
+        for _match in _LIMIT.finditer(_data):
+            _run['limits'][_match.group(1)] = float(_match.group(2))
+        _match = _DECIMALS.search(_data)
+        if _match:
+            _run['decimals'] = int(_match.group(1))
+        _match = _CURRENT_STATISTICS.match(_data)
+        if _match and _match.group(1) not in _run['current_statistics']:
+            _statistics = dict(_item.split(': ', 1) for _item in _match.group(2).split('; '))
+            _run['current_statistics'][_match.group(1)] = {k: float(v) for k, v in _statistics.items()}
+            continue
+        if _coil is None:
+            continue
+        if _data.startswith('Magnetometer Reading: '):
+            _values = _data[len('Magnetometer Reading: '):].split(',')
+            try:
+                if len(_values) == 3:
+                    _run['readings'][_coil].append([float(v) for v in _values])
+            except ValueError:
+                # Garbled reading, the live test skipped it as well
+                pass
+        elif _data.startswith('Magnetometer Baseline: '):
+            _run['baseline'][_coil] = [float(v) for v in _data[len('Magnetometer Baseline: '):].split(',')]
+        elif _coil not in _run['moments'] and _MOMENT.match(_data):
+            _run['moments'][_coil] = float(_MOMENT.match(_data).group(1))
+        else:
+            _match = _VOLTAGE.match(_data)
+            if _match and _match.group(1) not in _run['voltage']:
+                _run['voltage'][_match.group(1)] = float(_match.group(2))
+    return _run
+
+
+# DAQ970A fast mode keeps only the on-instrument statistics of the current: its
+# mean is the measured current and std/sqrt(count) its noise, as in the live test
+def set_current_statistics(inputs, coil, statistics):
+    inputs['current_mean'][coil] = statistics['mean']
+    if statistics.get('count', 0) > 1:
+        inputs['current_noise'][coil] = statistics['std'] / numpy.sqrt(statistics['count'])
+
+
+# Inputs of one run: currents, X readings (nT, baseline removed), voltages, calibration, old results
+def load_run(run):
+    with open(run['log'], 'r') as file:
+        _parsed = parse_log(file.read())
+    _old_moments = _parsed['moments']
+    if _parsed['decimals'] is not None:
+        # Reported results were rounded before the limit check
+        _old_moments = {c: round(m, _parsed['decimals']) for c, m in _old_moments.items()}
+    _inputs = {'calibration': _parsed['calibration'], 'voltage': _parsed['voltage'], 'current': {},
+               'current_mean': {}, 'current_noise': {}, 'steady_index': {}, 'field_x': {}, 'old_moments': _old_moments,
+               'old_limits': _parsed['limits'], 'old_pass': {}, 'source': 'log'}
+    for _coil, _statistics in _parsed['current_statistics'].items():
+        set_current_statistics(_inputs, _coil, _statistics)
+    for _coil, _readings in _parsed['readings'].items():
+        if _readings:
+            _x = numpy.array(_readings)[:, 0]
+            _inputs['field_x'][_coil] = _x - _parsed['baseline'].get(_coil, [0.0])[0]
+    if run['archive']:
+        _archive = RunArchive(run['archive'])
+        _metadata = _archive.metadata
+        _inputs['source'] = 'archive'
+        _inputs['calibration'] = _metadata['calibration']
+        _inputs['old_moments'] = _metadata['results']
+        _inputs['old_limits'] = _metadata['limits']
+        # Pass/fail of the live test, which may have been guard banded
+        _inputs['old_pass'] = {c: p == 'Pass' for c, p in _metadata.get('pass_fail', {}).items()}
+        _baseline = _metadata.get('magnetometer_baseline')
+        _zeroed = _baseline is not None and _metadata['config']['Test_Equipment'].get('Magnetometer_Baseline')
+        for _coil in COILS:
+            if f'current_{_coil}' in _archive:
+                _inputs['current'][_coil] = numpy.asarray(_archive[f'current_{_coil}'])
+            if f'magnetometer_{_coil}' in _archive:
+                _x = numpy.asarray(_archive[f'magnetometer_{_coil}'])[:, 1]
+                _inputs['field_x'][_coil] = _x - _baseline[0] if _zeroed else _x
+            if _coil in _metadata['measurements'] and 'voltage' in _metadata['measurements'][_coil]:
+                _inputs['voltage'][_coil] = _metadata['measurements'][_coil]['voltage']
+            # Settle detection averages the readings from the first steady one, not the last ones
+            if _metadata['measurements'].get(_coil, {}).get('steady_index') is not None:
+                _inputs['steady_index'][_coil] = _metadata['measurements'][_coil]['steady_index']
+            # DAQ970A fast mode keeps only the on-instrument average of the current
+            if _metadata['measurements'].get(_coil, {}).get('current_statistics'):
+                set_current_statistics(_inputs, _coil, _metadata['measurements'][_coil]['current_statistics'])
+                _inputs['current_mean'][_coil] = _metadata['measurements'][_coil]['current']
+    for _coil, _path in run['waveforms'].items():
+        if _coil not in _inputs['current']:
+            _waveform = pandas.read_csv(_path, header=None, names=['time', 'current'])
+            _inputs['current'][_coil] = _waveform['current'].to_numpy()
+    return _inputs
+
+
+# Recompute one run, returns one report row per coil
+def reprocess_run(run, params):
+    _rows = []
+    try:
+        _inputs = load_run(run)
+        if _inputs['calibration'] is None:
+            raise ValueError('no T0/R0 in log')
+        _calibration = _inputs['calibration']
+    except (OSError, ValueError, KeyError) as e:
+        return [{'sn': run['sn'], 'date': run['date'], 'loop': run['loop'], 'coil': None, 'error': str(e)}]
+    for _coil in COILS:
+        _row = {'sn': run['sn'], 'date': run['date'], 'loop': run['loop'], 'coil': _coil, 'source': _inputs['source'],
+                'old_moment': _inputs['old_moments'].get(_coil), 'old_limit': _inputs['old_limits'].get(_coil),
+                'new_limit': params['limits'][_coil], 'error': None}
+        try:
+            _x = _inputs['field_x'].get(_coil)
+            if _x is None or len(_x) == 0:
+                raise ValueError('no magnetometer readings')
+            _magnet, _magnet_noise = (float(v) * pow(10, -9) for v in sample_mean(_x[:params['magnet_average_count']]))
+            _curr_noise = 0.0
+            if _coil == 'AB':
+                _volt, _curr, _res0, _t0 = 99, 99, _calibration['R0_A'], _calibration['T0_A']
+            else:
+                if _coil not in _inputs['voltage']:
+                    raise ValueError('no coil voltage')
+                _volt = _inputs['voltage'][_coil]
+                if _coil in _inputs['current_mean']:
+                    _curr = _inputs['current_mean'][_coil]
+                    _curr_noise = float(_inputs['current_noise'].get(_coil, 0.0))
+                elif _coil in _inputs['current']:
+                    _waveform = _inputs['current'][_coil]
+                    if _coil in _inputs['steady_index']:
+                        _index = _inputs['steady_index'][_coil]
+                        _waveform = _waveform[_index:_index + params['current_average_count']]
+                    else:
+                        _waveform = _waveform[-params['current_average_count']:]
+                    _curr, _curr_noise = (float(v) for v in sample_mean(_waveform))
+                else:
+                    raise ValueError('no current waveform')
+                _res0, _t0 = _calibration[f'R0_{_coil}'], _calibration[f'T0_{_coil}']
+                _row.update(voltage=_volt, current=_curr)
+            _m_target = dipole_moment(_coil, _volt, _curr, _magnet, _res0, _t0,
+                                      params['alpha'], params['x_distance'], params['t_target'])[3]
+            _row['field'] = _magnet
+            _row['new_moment'] = round(_m_target, params['decimals'])
+            _row['new_pass'] = _row['new_moment'] >= params['limits'][_coil]
+            _uncertainty = params['uncertainty']
+            if _uncertainty.enabled:
+                _sigma = input_sigma(_uncertainty, _coil, _volt, _curr, _magnet, _res0, _curr_noise, _magnet_noise)
+                _interval = moment_interval(_coil, _volt, _curr, _magnet, _res0, _t0, params['alpha'],
+                                            params['x_distance'], params['t_target'], _sigma, _uncertainty.draws,
+                                            _uncertainty.confidence)
+                _row.update(moment_std=float(_interval.std), moment_low=round(float(_interval.low), params['decimals']),
+                            moment_high=round(float(_interval.high), params['decimals']))
+                if _uncertainty.guard_band:
+                    _row['new_pass'] = _row['moment_low'] >= params['limits'][_coil]
+        except (ValueError, KeyError, ZeroDivisionError) as e:
+            _row['error'] = str(e)
+        if _coil in _inputs['old_pass']:
+            _row['old_pass'] = _inputs['old_pass'][_coil]
+        elif _row['old_moment'] is not None and _row['old_limit'] is not None:
+            _row['old_pass'] = _row['old_moment'] >= _row['old_limit']
+        _rows.append(_row)
+    return _rows
+
+
+def main():
+    _parser = argparse.ArgumentParser(description='Recompute dipole moments of archived runs')
+    _parser.add_argument('root', help='directory tree with per-SN run folders')
+    _parser.add_argument('--config', default='Configuration.yaml', help='configuration with the new constants/limits')
+    _parser.add_argument('--output', default='reprocess_report.csv', help='diff report (CSV)')
+    _parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    _args = _parser.parse_args()
+
+    _params = load_parameters(load_config_file(_args.config))
+    _start = time.time()
+    _runs = find_runs(_args.root)
+    print(f'Found {len(_runs)} runs under "{_args.root}"')
+    _rows = []
+    _workers = _args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=_workers) as _executor:
+        _chunksize = max(1, len(_runs) // (4 * _workers))
+        for _run_rows in _executor.map(functools.partial(reprocess_run, params=_params), _runs, chunksize=_chunksize):
+            _rows.extend(_run_rows)
+
+    _columns = ['sn', 'date', 'loop', 'coil', 'source', 'voltage', 'current', 'field', 'old_moment', 'new_moment',
+                'delta', 'moment_std', 'moment_low', 'moment_high', 'old_limit', 'new_limit', 'old_pass', 'new_pass',
+                'changed', 'error']
+    _report = pandas.DataFrame(_rows).reindex(columns=_columns)
+    _report['delta'] = _report['new_moment'] - _report['old_moment']
+    _report['changed'] = _report['old_pass'].notna() & _report['new_pass'].notna() & \
+        (_report['old_pass'] != _report['new_pass'])
+    _report.to_csv(_args.output, index=False)
+
+    _runs_changed = _report.loc[_report['changed'], ['sn', 'date', 'loop']].drop_duplicates()
+    print(f'Reprocessed {len(_runs)} runs in {time.time() - _start:.1f} s, report saved to "{_args.output}"')
+    print(f'Pass/fail changed: {len(_runs_changed)} runs, {int(_report["changed"].sum())} coil results')
+    print(f'Errors: {int(_report["error"].notna().sum())}')
+    if _report['delta'].notna().any():
+        print(f'Moment delta: max |{_report["delta"].abs().max():.4f}| Am2')
+
+
+if __name__ == '__main__':
+    main()
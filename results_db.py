@@ -0,0 +1,226 @@
+# Dipole test results database
+# SQLite store for runs, per-coil results, limits, T0/R0 calibration inputs
+# and waveform file references, with an importer for test_data.csv files.
+#
+# Usage:
+#   python results_db.py import test_data.csv [more.csv ...]
+#   python results_db.py runs --sn MI-2222 [--since 2025-04-01] [--until 2025-05-01] [--fail]
+#   python results_db.py yield [--coil AB] [--since 2025-04-01] [--by-month]
+
+import argparse
+import os
+import sqlite3
+import threading
+
+COILS = ('A', 'B', 'AB')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    version TEXT,
+    sn TEXT NOT NULL,
+    test_time TEXT NOT NULL,        -- YYYY-MM-DD HH:MM:SS
+    overall TEXT NOT NULL,          -- PASS / FAIL
+    loop INTEGER,
+    t0_a REAL,
+    r0_a REAL,
+    t0_b REAL,
+    r0_b REAL,
+    log_file TEXT,
+    report_file TEXT,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS coil_results (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    coil TEXT NOT NULL,             -- A / B / AB
+    moment REAL,                    -- Am2
+    limit_lo REAL,                  -- Am2
+    pass_fail TEXT,                 -- Pass / Fail
+    voltage REAL,                   -- V
+    current REAL,                   -- A
+    field REAL,                     -- T
+    PRIMARY KEY (run_id, coil)
+);
+CREATE TABLE IF NOT EXISTS waveforms (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    coil TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (run_id, coil)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_sn ON runs (sn, test_time, name);
+CREATE INDEX IF NOT EXISTS idx_runs_time ON runs (test_time);
+CREATE INDEX IF NOT EXISTS idx_runs_overall ON runs (overall, test_time);
+CREATE INDEX IF NOT EXISTS idx_coil_pass ON coil_results (coil, pass_fail);
+'''
+
+
+class ResultsDatabase:
+    def __init__(self, path):
+        self.path = path
+        # Shared with the report writer thread, access is serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA foreign_keys = ON')
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _insert_run(self, run, coils, waveforms=None):
+        _cursor = self._conn.execute(
+            'INSERT INTO runs (name, version, sn, test_time, overall, loop, t0_a, r0_a, t0_b, r0_b, '
+            'log_file, report_file, source) '
+            'VALUES (:name, :version, :sn, :test_time, :overall, :loop, :t0_a, :r0_a, :t0_b, :r0_b, '
+            ':log_file, :report_file, :source)',
+            {k: run.get(k) for k in ('name', 'version', 'sn', 'test_time', 'overall', 'loop', 't0_a', 'r0_a',
+                                     't0_b', 'r0_b', 'log_file', 'report_file', 'source')})
+        _run_id = _cursor.lastrowid
+        self._conn.executemany(
+            'INSERT INTO coil_results (run_id, coil, moment, limit_lo, pass_fail, voltage, current, field) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(_run_id, c['coil'], c.get('moment'), c.get('limit_lo'), c.get('pass_fail'),
+              c.get('voltage'), c.get('current'), c.get('field')) for c in coils])
+        if waveforms:
+            self._conn.executemany('INSERT INTO waveforms (run_id, coil, path) VALUES (?, ?, ?)',
+                                   [(_run_id, coil, path) for coil, path in waveforms.items()])
+        return _run_id
+
+    # Store one run, "coils" is a list of per-coil dicts, returns the run id.
+    # Every live run is stored, loops finishing within the same second included.
+    def add_run(self, run, coils, waveforms=None):
+        with self._lock, self._conn:
+            return self._insert_run(run, coils, waveforms)
+
+    # Bulk import test_data.csv rows, returns (imported, duplicate, malformed).
+    # The n-th row with the same SN/time/name is a duplicate when n runs with
+    # that key are already stored, so importing a file again adds nothing.
+    def import_csv(self, csv_path):
+        _imported = _duplicate = _malformed = 0
+        _seen = {}
+        with open(csv_path, 'r') as file, self._lock, self._conn:
+            for _line in file:
+                _parsed = parse_csv_row(_line)
+                if _parsed is None:
+                    if _line.strip():
+                        _malformed += 1
+                    continue
+                _run, _coils = _parsed
+                _run['source'] = os.path.abspath(csv_path)
+                _key = (_run['sn'], _run['test_time'], _run['name'])
+                _seen[_key] = _seen.get(_key, 0) + 1
+                _stored = self._conn.execute('SELECT COUNT(*) FROM runs WHERE sn = ? AND test_time = ? AND name = ?',
+                                             _key).fetchone()[0]
+                if _stored >= _seen[_key]:
+                    _duplicate += 1
+                else:
+                    self._insert_run(_run, _coils)
+                    _imported += 1
+        return _imported, _duplicate, _malformed
+
+    def runs(self, sn=None, since=None, until=None, overall=None):
+        _where, _args = _filters(sn=sn, since=since, until=until, overall=overall)
+        with self._lock:
+            _rows = self._conn.execute(
+                'SELECT r.id, r.sn, r.test_time, r.overall, '
+                "MAX(CASE WHEN c.coil = 'A' THEN c.moment END) AS moment_a, "
+                "MAX(CASE WHEN c.coil = 'B' THEN c.moment END) AS moment_b, "
+                "MAX(CASE WHEN c.coil = 'AB' THEN c.moment END) AS moment_ab "
+                f'FROM runs r LEFT JOIN coil_results c ON c.run_id = r.id {_where} '
+                'GROUP BY r.id ORDER BY r.test_time', _args).fetchall()
+        return [dict(r) for r in _rows]
+
+    # Pass count and yield per coil, optionally per month
+    def yield_by_coil(self, coil=None, since=None, until=None, by_month=False):
+        _where, _args = _filters(since=since, until=until, coil=coil)
+        _month = 'substr(r.test_time, 1, 7)' if by_month else "''"
+        with self._lock:
+            _rows = self._conn.execute(
+                f"SELECT {_month} AS month, c.coil, COUNT(*) AS tested, "
+                "SUM(c.pass_fail = 'Pass') AS passed "
+                f'FROM coil_results c JOIN runs r ON r.id = c.run_id {_where} '
+                'GROUP BY month, c.coil ORDER BY month, c.coil', _args).fetchall()
+        return [dict(r, yield_pct=100.0 * r['passed'] / r['tested']) for r in _rows]
+
+
+def _filters(sn=None, since=None, until=None, overall=None, coil=None):
+    _clauses = []
+    _args = []
+    for _clause, _value in (('r.sn = ?', sn), ('r.test_time >= ?', since), ('r.test_time < ?', until),
+                            ('r.overall = ?', overall), ('c.coil = ?', coil)):
+        if _value is not None:
+            _clauses.append(_clause)
+            _args.append(_value)
+    return ('WHERE ' + ' AND '.join(_clauses)) if _clauses else '', _args
+
+
+# name,sn,version,time,A,limit,pass,B,limit,pass,AB,limit,pass,overall as written by save_txt_report
+def parse_csv_row(line):
+    _fields = [f.strip() for f in line.strip().split(',')]
+    if len(_fields) < 14:
+        return None
+    # The test name is free text, parse the fixed fields from the right
+    _name = ','.join(_fields[:-13])
+    _sn, _version, _time = _fields[-13:-10]
+    _overall = _fields[-1].upper()
+    if _overall not in ('PASS', 'FAIL'):
+        return None
+    _coils = []
+    try:
+        for _i, _coil in enumerate(COILS):
+            _moment, _limit, _pass_fail = _fields[-10 + 3 * _i:-7 + 3 * _i]
+            _coils.append({'coil': _coil, 'moment': float(_moment), 'limit_lo': float(_limit),
+                           'pass_fail': _pass_fail})
+    except ValueError:
+        return None
+    return {'name': _name, 'sn': _sn, 'version': _version, 'test_time': _time, 'overall': _overall}, _coils
+
+
+def main():
+    _parser = argparse.ArgumentParser(description='Dipole test results database')
+    _parser.add_argument('--db', default='results.db', help='database file (default: results.db)')
+    _commands = _parser.add_subparsers(dest='command', required=True)
+    _import = _commands.add_parser('import', help='import test_data.csv files')
+    _import.add_argument('csv', nargs='+')
+    _runs = _commands.add_parser('runs', help='list runs')
+    _runs.add_argument('--sn', help='e.g. MI-2222')
+    _runs.add_argument('--since', help='YYYY-MM-DD[ HH:MM:SS], inclusive')
+    _runs.add_argument('--until', help='YYYY-MM-DD[ HH:MM:SS], exclusive')
+    _runs.add_argument('--fail', action='store_true', help='failed runs only')
+    _yield = _commands.add_parser('yield', help='yield per coil')
+    _yield.add_argument('--coil', choices=COILS)
+    _yield.add_argument('--since', help='YYYY-MM-DD[ HH:MM:SS], inclusive')
+    _yield.add_argument('--until', help='YYYY-MM-DD[ HH:MM:SS], exclusive')
+    _yield.add_argument('--by-month', action='store_true')
+    _args = _parser.parse_args()
+
+    _db = ResultsDatabase(_args.db)
+    try:
+        if _args.command == 'import':
+            for _csv in _args.csv:
+                _imported, _duplicate, _malformed = _db.import_csv(_csv)
+                print(f'{_csv}: {_imported} imported, {_duplicate} already stored, {_malformed} malformed')
+        elif _args.command == 'runs':
+            _rows = _db.runs(sn=_args.sn, since=_args.since, until=_args.until,
+                             overall='FAIL' if _args.fail else None)
+            print(f"{'SN':<10} {'Test Date/Time':<19} {'A':>8} {'B':>8} {'AB':>8}  Result")
+            for _row in _rows:
+                print(f"{_row['sn']:<10} {_row['test_time']:<19} {_row['moment_a']:>8} {_row['moment_b']:>8} "
+                      f"{_row['moment_ab']:>8}  {_row['overall']}")
+            print(f'{len(_rows)} runs')
+        elif _args.command == 'yield':
+            _rows = _db.yield_by_coil(coil=_args.coil, since=_args.since, until=_args.until,
+                                      by_month=_args.by_month)
+            print(f"{'Month':<7} {'Coil':<4} {'Tested':>7} {'Passed':>7} {'Yield':>7}")
+            for _row in _rows:
+                print(f"{_row['month']:<7} {_row['coil']:<4} {_row['tested']:>7} {_row['passed']:>7} "
+                      f"{_row['yield_pct']:>6.1f}%")
+    finally:
+        _db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Binary run archive
+# One file per run holding both coil current waveforms, the magnetometer
+# samples, the run log and the run metadata.
+#
+# Layout (little endian):
+#   8 bytes   magic b'DIPOLRUN'
+#   uint32    format version
+#   uint32    header length
+#   header    JSON {"metadata": {...}, "arrays": {name: {dtype, shape, offset, nbytes, compression}}}
+#   arrays    raw array data, each starting on a 64 byte boundary
+#
+# Uncompressed arrays are memory-mapped by RunArchive (zero-copy reads),
+# zlib compressed arrays are decompressed on access.
+#
+# Usage:
+#   python run_archive.py MI-2222_run_20250422_144535_loop1.dra
+
+import json
+import struct
+import sys
+import zlib
+
+import numpy
+
+MAGIC = b'DIPOLRUN'
+VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct('<8sII')
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_run_archive(path, metadata, arrays, compress=False):
+    _entries = {}
+    _payloads = []
+    for _name, _array in arrays.items():
+        _array = numpy.ascontiguousarray(_array)
+        # Store little endian so the reader can memory-map on any platform
+        _array = _array.astype(_array.dtype.newbyteorder('<'), copy=False)
+        _data = _array.tobytes()
+        if compress:
+            _data = zlib.compress(_data)
+        _entries[_name] = {'dtype': _array.dtype.str, 'shape': list(_array.shape),
+                           'nbytes': len(_data), 'compression': 'zlib' if compress else 'none'}
+        _payloads.append((_name, _data))
+    # Offsets depend on the header length, which depends on the offsets
+    _offset_guess = 0
+    while True:
+        _offset = _align(_PREFIX.size + _offset_guess)
+        for _name, _data in _payloads:
+            _entries[_name]['offset'] = _offset
+            _offset = _align(_offset + len(_data))
+        _header = json.dumps({'metadata': metadata, 'arrays': _entries}).encode()
+        if len(_header) <= _offset_guess:
+            break
+        _offset_guess = len(_header) + 32
+    _header = _header.ljust(_offset_guess)
+    with open(path, 'wb') as file:
+        file.write(_PREFIX.pack(MAGIC, VERSION, len(_header)))
+        file.write(_header)
+        for _name, _data in _payloads:
+            file.seek(_entries[_name]['offset'])
+            file.write(_data)
+
+
+class RunArchive:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            _magic, _version, _header_length = _PREFIX.unpack(file.read(_PREFIX.size))
+            if _magic != MAGIC:
+                raise ValueError(f'"{path}" is not a run archive')
+            if _version > VERSION:
+                raise ValueError(f'"{path}" has unsupported archive version {_version}')
+            _header = json.loads(file.read(_header_length))
+        self.metadata = _header['metadata']
+        self._entries = _header['arrays']
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def keys(self):
+        return self._entries.keys()
+
+    def __getitem__(self, name):
+        _entry = self._entries[name]
+        _dtype = numpy.dtype(_entry['dtype'])
+        _shape = tuple(_entry['shape'])
+        if _entry['compression'] == 'none':
+            if _entry['nbytes'] == 0:
+                return numpy.empty(_shape, dtype=_dtype)
+            return numpy.memmap(self.path, dtype=_dtype, mode='r', offset=_entry['offset'], shape=_shape)
+        with open(self.path, 'rb') as file:
+            file.seek(_entry['offset'])
+            _data = zlib.decompress(file.read(_entry['nbytes']))
+        return numpy.frombuffer(_data, dtype=_dtype).reshape(_shape)
+
+    # Time axis and current for coil "A" or "B"
+    def waveform(self, coil):
+        _current = self[f'current_{coil}']
+        return numpy.arange(len(_current)) * self.metadata['sample_interval'][coil], _current
+
+    def log(self):
+        return self['log'].tobytes().decode() if 'log' in self else ''
+
+
+if __name__ == '__main__':
+    for _path in sys.argv[1:]:
+        _archive = RunArchive(_path)
+        print(_path)
+        for _key in ('sn', 'test_time', 'loop', 'results'):
+            print(f'  {_key}: {_archive.metadata.get(_key)}')
+        for _name in _archive.keys():
+            _array = _archive[_name]
+            print(f'  {_name}: {_array.dtype} {_array.shape}')
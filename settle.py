@@ -0,0 +1,35 @@
+# Steady-state detection for the streamed coil current
+# A window of readings is steady when the least squares slope across the
+# window and the standard deviation, both relative to the window mean, are
+# below their limits.
+
+import numpy
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class SettleDetector:
+    def __init__(self, window, relative_slope, relative_std):
+        self.window = window
+        self.relative_slope = relative_slope
+        self.relative_std = relative_std
+        self._x = numpy.arange(window) - (window - 1) / 2
+        self._sxx = float((self._x ** 2).sum())
+        self._checked = 0
+        self.settle_index = None
+
+    # "values" holds every reading so far; returns the index of the first
+    # reading of the first steady window, or None while still settling
+    def update(self, values):
+        if self.settle_index is not None or len(values) - self._checked < self.window:
+            return self.settle_index
+        _windows = sliding_window_view(values[self._checked:], self.window)
+        _mean = _windows.mean(axis=1)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            _change = numpy.abs((_windows @ self._x) / self._sxx * (self.window - 1) / _mean)
+            _spread = _windows.std(axis=1) / numpy.abs(_mean)
+        _steady = numpy.nonzero((_change <= self.relative_slope) & (_spread <= self.relative_std))[0]
+        if len(_steady):
+            self.settle_index = self._checked + int(_steady[0])
+        else:
+            self._checked = len(values) - self.window + 1
+        return self.settle_index
@@ -0,0 +1,361 @@
+# Instrument simulator backend
+# Emulates the Keysight N5748A/N5768A power supplies, the DAQ970A digitizer
+# and the FVM-400 magnetometer serial protocol so the full SCPI/serial code
+# path can run without bench hardware (Backend: Simulator).
+
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+
+import numpy
+import pyvisa
+from pyvisa import constants
+
+
+def _visa_timeout():
+    return pyvisa.VisaIOError(constants.StatusCode.error_timeout)
+
+
+class SimulatedBench:
+    # Shared physical state: coil outputs, coil currents and the field they produce
+    def __init__(self, config):
+        _sim = config['Simulator']
+        _equipment = config['Test_Equipment']
+        _constant = config['Test_Constant']
+        self.latency = float(_sim['Latency'])
+        self.error_rate = float(_sim['Error_Rate'])
+        self.current_noise = float(_sim['Current_Noise'])
+        self.voltage_noise = float(_sim['Voltage_Noise'])
+        self.field_noise = float(_sim['Field_Noise'])
+        self.field_background = [float(v) for v in _sim['Field_Background']]
+        self.magnetometer_reply_time = float(_sim['Magnetometer_Reply_Time'])
+        self.magnetometer_time_constant = float(_sim['Magnetometer_Time_Constant'])
+        _distance = float(_constant['X_DISTANCE_MAGNETOMETER'])
+        self.coils = {}
+        for _coil in ('A', 'B'):
+            _resistance = float(_sim[f'Coil_{_coil}_Resistance'])
+            self.coils[_coil] = {
+                'resistance': _resistance,
+                'tau': float(_sim[f'Coil_{_coil}_Inductance']) / _resistance,
+                # B = 2 m / (L^3 10^7), the inverse of calculate_dipole_moment
+                'field_per_amp': 2 * float(_sim[f'Coil_{_coil}_Moment_Per_Amp']) / (pow(_distance, 3) * pow(10, 7)),
+                'voltage': 0.0,
+                'output': False,
+                'switch_time': 0.0,
+                'level': 0.0,
+            }
+        self._resources = {
+            _equipment['Power_Supply_A_Resource_Name']: lambda: SimulatedPowerSupply(self, 'A', _equipment['Power_Supply_Model_A']),
+            _equipment['Power_Supply_B_Resource_Name']: lambda: SimulatedPowerSupply(self, 'B', _equipment['Power_Supply_Model_B']),
+            _equipment['DAQ_Resource_Name']: lambda: SimulatedDAQ970A(self),
+        }
+        self._lock = threading.Lock()
+
+    # Factory used by InstrumentPool in place of pyvisa.ResourceManager
+    def resource_manager(self):
+        return SimulatedResourceManager(self)
+
+    # Factory used by InstrumentPool in place of serial.Serial
+    def serial(self, **kwargs):
+        return SimulatedSerial(self, **kwargs)
+
+    def open_resource(self, resource_name):
+        if resource_name not in self._resources:
+            raise pyvisa.VisaIOError(constants.StatusCode.error_resource_not_found)
+        return self._resources[resource_name]()
+
+    def transaction(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            raise pyvisa.VisaIOError(constants.StatusCode.error_connection_lost)
+
+    def set_output(self, coil, state):
+        with self._lock:
+            _coil = self.coils[coil]
+            if _coil['output'] == state:
+                return
+            _now = time.time()
+            _coil['level'] = self._coil_current(_coil, _now)
+            _coil['output'] = state
+            _coil['switch_time'] = _now
+
+    # First order L/R step response from the last output switch
+    @staticmethod
+    def _coil_current(coil, t):
+        _target = coil['voltage'] / coil['resistance'] if coil['output'] else 0.0
+        _elapsed = max(0.0, t - coil['switch_time'])
+        return _target + (coil['level'] - _target) * math.exp(-_elapsed / coil['tau'])
+
+    def coil_current(self, coil, t):
+        return self._coil_current(self.coils[coil], t)
+
+    def coil_currents(self, coil, times):
+        _coil = self.coils[coil]
+        _target = _coil['voltage'] / _coil['resistance'] if _coil['output'] else 0.0
+        _elapsed = numpy.maximum(0.0, numpy.asarray(times) - _coil['switch_time'])
+        _current = _target + (_coil['level'] - _target) * numpy.exp(-_elapsed / _coil['tau'])
+        return _current + numpy.random.normal(0.0, self.current_noise, len(_current))
+
+    # X/Y/Z field in nT as seen by the magnetometer, which lags the coil current
+    def field(self, t):
+        _x = 0.0
+        _lag = self.magnetometer_time_constant
+        for _coil in self.coils.values():
+            _x += _coil['field_per_amp'] * pow(10, 9) * self._coil_current(_coil, t - _lag)
+        return (_x + self.field_background[0] + random.gauss(0.0, self.field_noise),
+                self.field_background[1] + random.gauss(0.0, self.field_noise),
+                self.field_background[2] + random.gauss(0.0, self.field_noise))
+
+
+class SimulatedResourceManager:
+    def __init__(self, bench):
+        self._bench = bench
+
+    def open_resource(self, resource_name):
+        return self._bench.open_resource(resource_name)
+
+    def close(self):
+        pass
+
+
+class SimulatedPowerSupply:
+    def __init__(self, bench, coil, model):
+        self._bench = bench
+        self._coil = coil
+        self._model = model
+        self.timeout = 2000
+
+    def write(self, command):
+        self._bench.transaction()
+        _command = command.strip().upper()
+        _match = re.match(r':?VOLT(?:AGE)?(?::LEV(?:EL)?)?\s+([-+0-9.E]+)', _command)
+        if _match:
+            self._bench.coils[self._coil]['voltage'] = float(_match.group(1))
+        elif _command in (':OUTP ON', 'OUTP ON', ':OUTP 1', 'OUTP 1'):
+            self._bench.set_output(self._coil, True)
+        elif _command in (':OUTP OFF', 'OUTP OFF', ':OUTP 0', 'OUTP 0'):
+            self._bench.set_output(self._coil, False)
+
+    def query(self, command):
+        self._bench.transaction()
+        _command = command.strip().upper()
+        if _command == '*IDN?':
+            return f'Keysight Technologies,N{self._model},SIM{self._coil}0001,A.00.00\n'
+        if _command in (':MEAS:VOLT?', 'MEAS:VOLT?'):
+            _coil = self._bench.coils[self._coil]
+            _volt = _coil['voltage'] if _coil['output'] else 0.0
+            return f'{_volt + random.gauss(0.0, self._bench.voltage_noise):.6E}\n'
+        if _command in (':MEAS:CURR?', 'MEAS:CURR?'):
+            return f'{self._bench.coil_current(self._coil, time.time()):.6E}\n'
+        raise _visa_timeout()
+
+    def close(self):
+        pass
+
+
+class SimulatedDAQ970A:
+    # Digitize mode only: ACQ:CURR:DC <range>,<count>,<timer>,(@<channel>) then READ?,
+    # INIT with DATA:REM? streaming, or INIT/*OPC? with CALC:AVER statistics
+    CHANNELS = {'121': 'A', '122': 'B'}
+
+    def __init__(self, bench):
+        self._bench = bench
+        self._count = 0
+        self._timer = 0.001
+        self._coil = None
+        self._binary = False
+        self._init_time = None
+        self._abort_time = None
+        self._removed = 0
+        self._readings = numpy.empty(0)
+        self.timeout = 2000
+
+    def write(self, command):
+        self._bench.transaction()
+        _command = command.strip().upper()
+        _match = re.match(r'ACQ(?:UIRE)?:CURR(?:ENT)?(?::DC)?\s+([^,]+),([^,]+),([^,]+),\(@(\d+)\)', _command)
+        if _match:
+            self._count = int(float(_match.group(2)))
+            self._timer = float(_match.group(3))
+            self._coil = self.CHANNELS.get(_match.group(4))
+        elif _command.startswith('FORM'):
+            self._binary = 'REAL' in _command
+        elif _command in ('INIT', ':INIT', 'INIT:IMM'):
+            self._init_time = time.time()
+            self._abort_time = None
+            self._removed = 0
+        elif _command in ('ABOR', ':ABOR', 'ABORT'):
+            self._abort_time = time.time()
+        elif _command.startswith('CALC:AVER:CLE'):
+            self._readings = numpy.empty(0)
+
+    # Readings taken since INIT and not removed yet
+    def _points(self):
+        if self._init_time is None:
+            return 0
+        _now = time.time() if self._abort_time is None else self._abort_time
+        _taken = min(self._count, int((_now - self._init_time) / self._timer))
+        return _taken - self._removed
+
+    def _remove(self, count):
+        _count = min(count, self._points())
+        _times = self._init_time + (self._removed + numpy.arange(_count)) * self._timer
+        self._removed += _count
+        return self._bench.coil_currents(self._coil, _times)
+
+    def _digitize(self):
+        if self._coil is None or self._count <= 0:
+            raise _visa_timeout()
+        _duration = self._count * self._timer
+        if _duration * 1000 > self.timeout:
+            # Real instrument answers after the timeout expired
+            raise _visa_timeout()
+        _start = time.time()
+        time.sleep(_duration)
+        self._readings = self._bench.coil_currents(self._coil, _start + numpy.arange(self._count) * self._timer)
+        return self._readings
+
+    # *OPC? after INIT: wait for the digitize and keep its readings for CALC:AVER
+    def _complete(self):
+        if self._init_time is None:
+            return
+        time.sleep(max(0.0, self._init_time + self._count * self._timer - time.time()))
+        self._readings = self._bench.coil_currents(
+            self._coil, self._init_time + numpy.arange(self._count) * self._timer)
+
+    def query(self, command):
+        self._bench.transaction()
+        _command = command.strip().upper()
+        if _command == '*IDN?':
+            return 'Keysight Technologies,DAQ970A,SIM0001,A.00.00\n'
+        if _command in ('READ?', ':READ?'):
+            if self._binary:
+                # ASCII query of a binary block would fail to decode
+                raise _visa_timeout()
+            return ','.join(f'{v:+.9E}' for v in self._digitize()) + '\n'
+        if _command == '*OPC?':
+            self._complete()
+            return '1\n'
+        _match = re.match(r'CALC:AVER:(AVER|SDEV|MIN|MAX|COUN)\?', _command)
+        if _match:
+            if len(self._readings) == 0:
+                return '+9.91000000E+37\n'
+            _value = {'AVER': numpy.mean, 'SDEV': lambda r: numpy.std(r, ddof=1), 'MIN': numpy.min,
+                      'MAX': numpy.max, 'COUN': len}[_match.group(1)](self._readings)
+            return f'{_value:+.9E}\n'
+        if _command in ('DATA:POIN?', 'DATA:POINTS?'):
+            return f'{self._points():+d}\n'
+        _match = re.match(r'DATA:REM(?:OVE)?\?\s+(\d+)', _command)
+        if _match:
+            if self._binary:
+                raise _visa_timeout()
+            return ','.join(f'{v:+.9E}' for v in self._remove(int(_match.group(1)))) + '\n'
+        raise _visa_timeout()
+
+    def query_binary_values(self, command, datatype='d', is_big_endian=False, container=list, **kwargs):
+        self._bench.transaction()
+        _command = command.strip().upper()
+        if not self._binary:
+            raise _visa_timeout()
+        if _command in ('READ?', ':READ?'):
+            return container(self._digitize())
+        _match = re.match(r'DATA:REM(?:OVE)?\?\s+(\d+)', _command)
+        if _match:
+            return container(self._remove(int(_match.group(1))))
+        raise _visa_timeout()
+
+    def close(self):
+        pass
+
+
+class SimulatedSerial:
+    # FVM-400 serial protocol: "SCn"/"SMn" are acknowledged with "A\x04",
+    # "?" is answered with "A\x04A\x04 x,y,z\rD\x04" after the reply time
+    def __init__(self, bench, port=None, baudrate=9600, timeout=None, **kwargs):
+        self._bench = bench
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+        self._pending = deque()       # (ready time, bytes)
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+
+    def _collect(self):
+        _now = time.time()
+        while self._pending and self._pending[0][0] <= _now:
+            self._buffer += self._pending.popleft()[1]
+
+    def _check_open(self):
+        if not self.is_open:
+            raise OSError('Port is closed')
+
+    @property
+    def in_waiting(self):
+        with self._lock:
+            self._check_open()
+            self._collect()
+            return len(self._buffer)
+
+    def write(self, data):
+        with self._lock:
+            self._check_open()
+            if self._bench.error_rate > 0 and random.random() < self._bench.error_rate:
+                raise OSError('Simulated serial failure')
+            _now = time.time()
+            _command = bytes(data).strip()
+            if _command == b'?':
+                _ready = _now + self._bench.magnetometer_reply_time
+                _x, _y, _z = self._bench.field(_ready)
+                self._pending.append((_ready, b'A\x04A\x04 %.0f,%.0f,%.0f\rD\x04' % (_x, _y, _z)))
+            elif _command[:2] in (b'SC', b'SM'):
+                self._pending.append((_now + self._bench.latency, b'A\x04'))
+            return len(data)
+
+    def _wait(self, done):
+        _deadline = None if self.timeout is None else time.time() + self.timeout
+        while True:
+            with self._lock:
+                self._check_open()
+                self._collect()
+                if done(self._buffer):
+                    return
+                _next = self._pending[0][0] if self._pending else None
+            _now = time.time()
+            if _deadline is not None and _now >= _deadline:
+                return
+            _sleep = 0.001 if _next is None else max(0.0, _next - _now)
+            if _deadline is not None:
+                _sleep = min(_sleep, _deadline - _now)
+            time.sleep(max(_sleep, 0.0001))
+
+    def read(self, size=1):
+        self._wait(lambda buffer: len(buffer) >= size)
+        with self._lock:
+            _data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            return _data
+
+    def read_until(self, expected=b'\n', size=None):
+        self._wait(lambda buffer: expected in buffer)
+        with self._lock:
+            _end = self._buffer.find(expected)
+            _end = len(self._buffer) if _end < 0 else _end + len(expected)
+            _data = bytes(self._buffer[:_end])
+            del self._buffer[:_end]
+            return _data
+
+    def readline(self):
+        return self.read_until(b'\n')
+
+    def reset_input_buffer(self):
+        with self._lock:
+            self._pending.clear()
+            self._buffer.clear()
+
+    def close(self):
+        self.is_open = False
@@ -0,0 +1,67 @@
+# Soak statistics
+# Single-pass running statistics per coil and quantity for long repeatability
+# runs: Welford mean/std, min/max, and drift as the least squares slope
+# against time, all updated one loop at a time without keeping the history.
+
+import math
+
+QUANTITIES = ('moment', 'current', 'field')
+
+
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._m2 = 0.0
+        self._mean_t = 0.0
+        self._m2_t = 0.0
+        self._c_tv = 0.0
+
+    def add(self, value, t):
+        self.count += 1
+        _dv = value - self.mean
+        _dt = t - self._mean_t
+        self.mean += _dv / self.count
+        self._mean_t += _dt / self.count
+        self._m2 += _dv * (value - self.mean)
+        self._m2_t += _dt * (t - self._mean_t)
+        self._c_tv += _dt * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    # Slope against time, units per hour
+    @property
+    def drift(self):
+        return 3600.0 * self._c_tv / self._m2_t if self._m2_t > 0 else 0.0
+
+
+class SoakStatistics:
+    def __init__(self):
+        self.loops = 0
+        self.failed = 0
+        self._stats = {}
+
+    # "measurements" is {coil: {quantity: value}}, t in seconds (time.time())
+    def add(self, t, measurements, overall):
+        self.loops += 1
+        if overall != 'PASS':
+            self.failed += 1
+        for _coil, _values in measurements.items():
+            for _quantity in QUANTITIES:
+                if _values.get(_quantity) is not None:
+                    self._stats.setdefault((_coil, _quantity), RunningStats()).add(float(_values[_quantity]), t)
+
+    def lines(self):
+        _lines = [f'Soak statistics: {self.loops} loops, {self.failed} failed',
+                  f"  {'Coil':<4} {'Quantity':<8} {'N':>5} {'Mean':>12} {'Std':>11} {'Min':>12} {'Max':>12} "
+                  f"{'Drift/h':>11}"]
+        for (_coil, _quantity), _stats in self._stats.items():
+            _lines.append(f'  {_coil:<4} {_quantity:<8} {_stats.count:5d} {_stats.mean:12.6g} {_stats.std:11.4g} '
+                          f'{_stats.min:12.6g} {_stats.max:12.6g} {_stats.drift:11.4g}')
+        return _lines
@@ -0,0 +1,996 @@
+# Test station
+# One fixture: its instruments (two power supplies, DAQ970A, FVM-400), DUT
+# calibration, per-run logs and results. Several stations run in one process,
+# each on its own thread, sharing the log writer, results database and tracer.
+
+import copy
+import datetime
+import functools
+import io
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+import instruments
+from dipole import dipole_moment, input_sigma, moment_interval, sample_mean
+from instruments import InstrumentPool, InstrumentError
+from magnetometer import FVM400, MagnetometerReader, RELATIVE_MODE
+from run_archive import write_run_archive
+from settle import SettleDetector
+from soak import SoakStatistics
+from tracing import tracer
+
+# test_data.csv is shared by all stations
+_csv_lock = threading.Lock()
+# console output is shared by all stations
+_print_lock = threading.Lock()
+
+
+class Station:
+    # sn/T0/R0 of the DUT entered at startup, None in batch mode where every
+    # job of the queue brings its own
+    def __init__(self, config, file_writer, results_db, sn, t0_a, r0_a, t0_b, r0_b, prefix_output=False,
+                 checkpoint=None):
+        self.config = config
+        self.name = config.station_name
+        self.file_writer = file_writer
+        self.results_db = results_db
+        self.sn = sn
+        self.t0_a, self.r0_a, self.t0_b, self.r0_b = t0_a, r0_a, t0_b, r0_b
+        self.prefix_output = prefix_output
+        self.checkpoint = checkpoint
+        self.duts = []
+        # Queue file and row of the current batch job
+        self.job_source = None
+        # Instrument sessions are opened on first use and kept for all loops
+        if config.backend == 'Simulator':
+            # Simulated power supplies, DAQ970A and FVM-400 behind the same SCPI/serial code path
+            from simulator import SimulatedBench
+            self.simulator_bench = SimulatedBench(config.raw)
+            self.instrument_pool = InstrumentPool(retries=config.equipment.instrument_retries,
+                                                  resource_manager_factory=self.simulator_bench.resource_manager,
+                                                  serial_factory=self.simulator_bench.serial)
+        else:
+            self.instrument_pool = InstrumentPool(retries=config.equipment.instrument_retries)
+        self.magnetometer_reader = None
+        self.magnetometer_session = None
+        self.fvm400 = FVM400(ack_timeout=config.equipment.magnetometer_ack_timeout,
+                             fallback_delay=config.equipment.magnetometer_write_delay)
+        self.v5748A_A_resource = None
+        self.v5748A_B_resource = None
+        self.daq970A_resource = None
+        # Per loop state
+        self.loop = 0
+        self.test_measurements = {}
+        self.run_arrays = {}
+        self.current_statistics = {}
+        # Per coil: standard error of the averaged current/field samples and the
+        # Monte Carlo interval of the moment
+        self.uncertainty = {}
+        # Per coil index of the first steady current reading (settle detection)
+        self.steady_index = {}
+        self.fast_current = False
+        self.log_path = None
+        self.log_file_path = None
+        self.waveform_file_path_A = None
+        self.waveform_file_path_B = None
+        self.run_archive_path = None
+        # (loop, overall, cycle time) of every finished loop
+        self.cycles = []
+        # Units started on this station, across loops and DUTs
+        self.units_started = 0
+        self.error = None
+        # Soak mode: background report thread and running statistics
+        self.report_executor = None
+        self.soak_statistics = None
+        self._pending_report = None
+
+    def print(self, *args):
+        text = ' '.join(str(a) for a in args)
+        if self.prefix_output:
+            text = f'[{self.name}] ' + text
+        # A single write under the lock so lines of parallel stations do not interleave
+        with _print_lock:
+            sys.stdout.write(text + '\n')
+            sys.stdout.flush()
+
+    def log(self, data):
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        self.file_writer.write(self.log_file_path, f"{timestamp}\t{data} \n")
+
+    def log_lines(self, lines):
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        self.file_writer.write(self.log_file_path, ''.join(f"{timestamp}\t{line} \n" for line in lines))
+
+    # Configure Keysight N5748A
+    def open_n5748a(self, coil):
+        _resource_name = self.config.equipment.power_supply_resource(coil)
+        _model = self.config.equipment.power_supply_model(coil)
+        _timeout = self.config.equipment.power_supply_timeout
+        try:
+            # Opened and identified once, later loops reuse the session
+            _v5748A_resource = self.instrument_pool.visa(_resource_name, _model, _timeout)
+            self.print(f"Connected to Keysight 57x8A {_v5748A_resource.idn}")
+            self.log(f'Connected to Keysight 57x8A {_v5748A_resource.idn}')
+            return _v5748A_resource
+        except InstrumentError as e:
+            self.print(f"Incorrect Power Supply Model {_model}! {e}")
+            self.log(f"Incorrect Power Supply Model {_model}! {e}")
+            exit()
+        except instruments.VisaIOError as e:
+            self.print(f"Error: Could not connect to 57x8A {_resource_name}.\n{e}")
+            self.log(f"Error: Could not connect to 57x8A {_resource_name}.{e}")
+            exit()
+
+    def config_n5748a(self, coil, resource):
+        _voltage = self.config.equipment.power_supply_voltage
+        _current = self.config.equipment.power_supply_current_limit
+        resource.write(_voltage)  # SCPI command to set voltage
+        self.print(f"Voltage {coil} set to {_voltage}")
+        resource.write(_current)  # SCPI command to set current limit
+        self.print(f"Current limit {coil} set to {_current}")
+        resource.write(':OUTP OFF')  # SCPI command to disable output
+        self.print(f"Output {coil} disabled")
+
+    # Configure Keysight DAQ970A
+    def open_daq970a(self, resource_name):
+        _model = self.config.equipment.daq_model
+        _timeout = self.config.equipment.daq_timeout
+        try:
+            _daq970A_resource = self.instrument_pool.visa(resource_name, _model, _timeout)
+            self.print(f'Connected to Keysight daq970A {_daq970A_resource.idn}')
+            self.log(f'Connected to Keysight daq970A {_daq970A_resource.idn}')
+            return _daq970A_resource
+        except InstrumentError as e:
+            self.print(f"Error: Model {e}")
+            self.log(f"Incorrect DAQ Model {_model}! {e}")
+            exit()
+        except instruments.VisaIOError as e:
+            self.print(f"Error: Could not connect to DAQ970A {resource_name}.\n{e}")
+            self.log(f"Error: Could not connect to DAQ970A {resource_name}.{e}")
+            exit()
+
+    def config_daq970a(self, resource, coil):
+        if self.fast_current:
+            _fast_config = self.config.fast_mode.digitize(coil)
+            resource.write(_fast_config.command)  # SCPI command to config digitize of the steady readings only
+            resource.write(f'CALC:AVER:STAT ON,{_fast_config.channel}')  # SCPI command to enable statistics
+            self.print(f"Digitize set to {_fast_config.command}, on-instrument averaging")
+            self.log(f"Digitize set to {_fast_config.command}, on-instrument averaging")
+            return
+        _digitize_config_a = self.config.equipment.daq_digitize_a.command
+        _digitize_config_b = self.config.equipment.daq_digitize_b.command
+        if coil == "A":
+            resource.write(_digitize_config_a)  # SCPI command to config digitize
+            self.print(f"Digitize set to {_digitize_config_a}")
+            self.log(f"Digitize set to {_digitize_config_a}")
+        if coil == "B":
+            resource.write(_digitize_config_b)  # SCPI command to config digitize
+            self.print(f"Digitize set to {_digitize_config_b}")
+            self.log(f"Digitize set to {_digitize_config_b}")
+        if self.config.equipment.daq_binary_transfer:
+            _data_format = self.config.equipment.daq_binary_format
+            resource.write(_data_format)  # SCPI command to select binary REAL readings
+            self.log(f"Data format set to {_data_format}")
+
+    # Configure Magnetometer Serial
+    def open_serial(self):
+        try:
+            # The port stays open across loops, configure_magnetometer runs on (re)connect only
+            return self.instrument_pool.serial(self.config.equipment.magnetometer_com,
+                                               self.config.equipment.magnetometer_baud_rate,
+                                               on_open=self.configure_magnetometer)
+        except instruments.SerialException as e:
+            self.print(f"Error opening with serial port:\n{e}")
+            exit()
+
+    def configure_magnetometer(self, ser):
+        self.print('Connected to Magnetometer FVM-400')
+        self.log('Connected to Magnetometer FVM-400')
+        self.fvm400.attach(ser)
+        # Only channels not already in relative mode are configured
+        for _channel, _acked in self.fvm400.configure(RELATIVE_MODE):
+            if not _acked:
+                self.log(f'No reply from FVM-400 for channel {_channel}, paced by write delay')
+        self.print('Configured to Rel mode')
+        self.log('Configured to Rel mode')
+
+    # Start the FVM-400 reader thread, reconnect the port if the previous reader lost it
+    def start_magnetometer_reader(self):
+        if self.magnetometer_reader is not None and self.magnetometer_reader.error is not None:
+            # The reader wakes the waiters with its error before its thread ends
+            self.magnetometer_reader.join()
+        if self.magnetometer_reader is not None and self.magnetometer_reader.is_alive():
+            return
+        if self.magnetometer_reader is not None:
+            self.print(f"Magnetometer reader stopped ({self.magnetometer_reader.error}), reconnecting")
+            self.log(f"Magnetometer reader stopped ({self.magnetometer_reader.error}), reconnecting")
+            # The instrument may have been power cycled, configure it again
+            self.fvm400.invalidate()
+            _ser = self.magnetometer_session.reconnect()
+        else:
+            _ser = self.magnetometer_session.open()
+        self.magnetometer_reader = MagnetometerReader(
+            _ser,
+            buffer_size=self.config.equipment.magnetometer_buffer_size)
+        self.magnetometer_reader.name = f'{self.name} FVM-400 reader'
+        self.magnetometer_reader.start()
+
+    # Relative-zero with every coil off, reused across DUTs until it is too old
+    def capture_magnetometer_baseline(self):
+        _max_age = self.config.equipment.magnetometer_baseline_max_age
+        if self.fvm400.baseline_valid(_max_age):
+            self.log(f"Reuse Magnetometer Baseline: {self.fvm400.baseline}")
+            return
+        _count = self.config.constants.magnet_average_count
+        _timeout = self.config.equipment.magnetometer_read_timeout
+        try:
+            _baseline = self.fvm400.capture_baseline(self.magnetometer_reader, _count, _timeout)
+        except OSError as e:
+            self.print(f"Error: Could not read Magnetometer FVM-400. {e}")
+            self.log(f"Error: Could not read Magnetometer FVM-400. {e}")
+            exit()
+        self.print(f"Magnetometer Baseline: {_baseline}")
+        self.log(f"Capture Magnetometer Baseline: {_baseline}")
+
+    def magnet_field_test(self, coil, since=None):
+        _average_count = self.config.constants.magnet_average_count
+        _settle = self.config.equipment.magnetometer_settle_delay
+        _timeout = self.config.equipment.magnetometer_read_timeout
+        # Only use readings received after the field settled
+        _since = time.time() + _settle if since is None else since
+        for _attempt in range(2):
+            try:
+                _samples = self.magnetometer_reader.wait_for_samples(_average_count, since=_since,
+                                                                     timeout=_settle + _timeout)
+                break
+            except TimeoutError as e:
+                self.print(f"Error: Could not read Magnetometer FVM-400. {e}")
+                self.log(f"Error: Could not read Magnetometer FVM-400. {e}")
+                exit()
+            except OSError as e:
+                if _attempt == 0:
+                    # Port lost, reconnect once and read again
+                    self.start_magnetometer_reader()
+                    _since = time.time() + _settle
+                    continue
+                self.print(f"Error: Could not read Magnetometer FVM-400. {e}")
+                self.log(f"Error: Could not read Magnetometer FVM-400. {e}")
+                exit()
+        for _t, _x, _y, _z in _samples:
+            self.log(f"Magnetometer Reading: {_x:g},{_y:g},{_z:g}")
+        self.run_arrays[f'magnetometer_{coil}'] = numpy.array(_samples)
+        if self.config.equipment.magnetometer_baseline:
+            _samples = self.fvm400.zero(_samples)
+            _baseline = self.fvm400.baseline
+            self.log(f"Magnetometer Baseline: {_baseline[0]:g},{_baseline[1]:g},{_baseline[2]:g}")
+        if self.magnetometer_reader.garbled:
+            self.log(f"Magnetometer garbled frames: {self.magnetometer_reader.garbled}")
+        m_array_x = [s[1] for s in _samples]
+        self.print(m_array_x)
+        self.print([s[2] for s in _samples])
+        self.print([s[3] for s in _samples])
+        x_average, _noise = sample_mean(m_array_x)
+        self.uncertainty.setdefault(coil, {})['field_noise'] = float(_noise) * pow(10, -9)
+        return float(x_average) * pow(10, -9)
+
+    @tracer.traced('calculate')
+    def calculate_dipole_moment(self, coil, volt, curr, magnet, res0, t0):
+        _alph = self.config.constants.alpha
+        _x_dis = self.config.constants.x_distance
+        _t_target = self.config.constants.t_target
+        _r, t, m, m_target = dipole_moment(coil, volt, curr, magnet, res0, t0, _alph, _x_dis, _t_target)
+        self.print(f"R: {_r}; R0: {res0}; T: {t}; T0: {t0}; Alpha: {_alph}; Moment: {m}; Moment Target: {m_target}")
+        self.log(f"R: {_r}; R0: {res0}; T: {t}; T0: {t0}; Alpha: {_alph}")
+        self.log(f"Moment: {m}; Moment Target: {m_target}")
+        if self.config.uncertainty.enabled:
+            self.calculate_uncertainty(coil, volt, curr, magnet, res0, t0)
+        return m_target
+
+    # Monte Carlo confidence interval of the moment
+    def calculate_uncertainty(self, coil, volt, curr, magnet, res0, t0):
+        _constants = self.config.constants
+        _uncertainty = self.config.uncertainty
+        _coil_uncertainty = self.uncertainty.setdefault(coil, {})
+        _sigma = input_sigma(_uncertainty, coil, volt, curr, magnet, res0,
+                             _coil_uncertainty.get('current_noise', 0.0), _coil_uncertainty.get('field_noise', 0.0))
+        _interval = moment_interval(coil, volt, curr, magnet, res0, t0, _constants.alpha, _constants.x_distance,
+                                    _constants.t_target, _sigma, _uncertainty.draws, _uncertainty.confidence)
+        _coil_uncertainty.update(std=float(_interval.std), low=float(_interval.low), high=float(_interval.high),
+                                 confidence=_uncertainty.confidence)
+        self.print(f"Moment Target std: {float(_interval.std):.4g}; {100 * _uncertainty.confidence:g}% interval: "
+                   f"{float(_interval.low):.6g} to {float(_interval.high):.6g}")
+        self.log(f"Moment Target std: {float(_interval.std)}; {100 * _uncertainty.confidence:g}% interval: "
+                 f"{float(_interval.low)} to {float(_interval.high)}")
+
+    def coil_volt_test(self, coil):
+        _volt = 0
+        try:
+            if coil == 'A':
+                _volt = self.v5748A_A_resource.query(':MEAS:VOLT?')
+                self.log(f"Coil_A voltage: {_volt}")
+            if coil == 'B':
+                _volt = self.v5748A_B_resource.query(':MEAS:VOLT?')
+                self.log(f"Coil_B voltage: {_volt}")
+            return float(_volt)
+        except instruments.VisaIOError as e:
+            self.print(f"Error: Could not communicate to 5748A. {e}")
+            exit()
+
+    def coil_curr_test(self, coil):
+        _average_count = self.config.constants.current_average_count
+        _timer = self.config.equipment.daq_digitize(coil).interval
+        try:
+            if self.config.equipment.daq_binary_transfer:
+                _curr = self.daq970A_resource.query_binary_values('READ?', datatype='d', is_big_endian=True,
+                                                                  container=numpy.array)
+            else:
+                _curr = numpy.array(str(self.daq970A_resource.query('READ?')).split(','), dtype=float)
+            self.record_waveform(coil, _curr, _timer)
+            # get last n current reading
+            curr_average, _noise = sample_mean(_curr[-_average_count:])
+            self.uncertainty.setdefault(coil, {})['current_noise'] = float(_noise)
+            return float(curr_average)
+        except instruments.VisaIOError as e:
+            self.print(f"Error: Could not communicate to DAQ970A. {e}")
+            exit()
+
+    # Fast mode: the DAQ970A averages the digitize itself, only the statistics cross the bus
+    def coil_curr_fast(self, coil):
+        _fast_mode = self.config.fast_mode
+        _channel = _fast_mode.digitize(coil).channel
+        try:
+            self.daq970A_resource.write(f'CALC:AVER:CLE {_channel}')  # SCPI command to clear the statistics
+            # Only readings of the steady current are averaged
+            tracer.sleep(_fast_mode.settle_delay, 'DAQ settle delay')
+            self.daq970A_resource.write('INIT')  # SCPI command to start the digitize
+            self.daq970A_resource.query('*OPC?')  # returns once the digitize is complete
+            curr_average = float(self.daq970A_resource.query(f'CALC:AVER:AVER? {_channel}'))
+            _statistics = {'mean': curr_average}
+            if _fast_mode.statistics:
+                for _name, _query in (('std', 'SDEV'), ('min', 'MIN'), ('max', 'MAX'), ('count', 'COUN')):
+                    _statistics[_name] = float(self.daq970A_resource.query(f'CALC:AVER:{_query}? {_channel}'))
+        except instruments.VisaIOError as e:
+            self.print(f"Error: Could not communicate to DAQ970A. {e}")
+            exit()
+        self.log(f"Coil_{coil} current statistics: " + '; '.join(f'{k}: {v}' for k, v in _statistics.items()))
+        self.current_statistics[coil] = _statistics
+        if _statistics.get('count', 0) > 1:
+            self.uncertainty.setdefault(coil, {})['current_noise'] = \
+                float(_statistics['std'] / numpy.sqrt(_statistics['count']))
+        return curr_average
+
+    # Fast mode: digitize the full waveform of a failing coil for failure analysis,
+    # the result of the fast measurement stays the test result
+    def capture_failure_waveform(self, coil, resource):
+        self.log(f"Coil_{coil} failed, capture the full current waveform")
+        _fast_current, self.fast_current = self.fast_current, False
+        _uncertainty = dict(self.uncertainty.get(coil, {}))
+        try:
+            self.config_daq970a(self.daq970A_resource, coil)
+            resource.write(':OUTP ON')
+            self.log(f"Output {coil} enabled")
+            self.coil_curr_test(coil)
+            resource.write(':OUTP OFF')
+            self.log(f"Output {coil} disabled")
+        finally:
+            self.fast_current = _fast_current
+            # The moment was calculated from the fast measurement, not from this waveform
+            self.uncertainty[coil] = _uncertainty
+
+    def record_waveform(self, coil, curr, timer):
+        self.run_arrays[f'current_{coil}'] = curr
+        if self.config.waveform_csv:
+            _time = numpy.arange(len(curr)) * timer
+            self.save_waveform(self.waveform_file_path_A if coil == 'A' else self.waveform_file_path_B, _time, curr)
+
+    # Stream the DAQ970A digitize while it runs and stop as soon as the current is steady
+    # Returns the average of CURRENT_AVERAGE_COUNT steady readings and the time steady state was detected
+    def coil_curr_settle(self, coil):
+        _average_count = self.config.constants.current_average_count
+        _count = self.config.equipment.daq_digitize(coil).count
+        _timer = self.config.equipment.daq_digitize(coil).interval
+        _settle_config = self.config.settle
+        _poll = _settle_config.poll_interval
+        _timeout = _settle_config.timeout
+        _detector = SettleDetector(_settle_config.window, _settle_config.relative_slope, _settle_config.relative_std)
+        _curr = numpy.empty(0)
+        try:
+            _start = time.time()
+            self.daq970A_resource.write('INIT')  # SCPI command to start the digitize
+            while True:
+                _points = int(float(self.daq970A_resource.query('DATA:POIN?')))
+                if _points > 0:
+                    # Readings come in the FORM:DATA selected by config_daq970a
+                    if self.config.equipment.daq_binary_transfer:
+                        _new = self.daq970A_resource.query_binary_values(f'DATA:REM? {_points}', datatype='d',
+                                                                         is_big_endian=True, container=numpy.array)
+                    else:
+                        _new = numpy.array(str(self.daq970A_resource.query(f'DATA:REM? {_points}')).split(','),
+                                           dtype=float)
+                    _curr = numpy.concatenate((_curr, _new))
+                _index = _detector.update(_curr)
+                if _index is not None and len(_curr) >= _index + max(_average_count, _detector.window):
+                    break
+                if len(_curr) >= _count or time.time() - _start > _timeout:
+                    break
+                tracer.sleep(_poll, 'Settle poll')
+            self.daq970A_resource.write('ABOR')  # SCPI command to stop the digitize
+        except instruments.VisaIOError as e:
+            self.print(f"Error: Could not communicate to DAQ970A. {e}")
+            exit()
+        self.record_waveform(coil, _curr, _timer)
+        if _index is None:
+            self.print(f"Coil_{coil} current not steady after {len(_curr)} readings, using the last {_average_count}")
+            self.log(f"Coil_{coil} current not steady after {len(_curr)} readings, using the last {_average_count}")
+            _steady = _curr[-_average_count:]
+            _settle_time = time.time()
+        else:
+            self.log(f"Coil_{coil} current steady at {_index * _timer:.4f} s, stopped after {len(_curr)} readings")
+            self.steady_index[coil] = int(_index)
+            _steady = _curr[_index:_index + _average_count]
+            _settle_time = _start + (_index + _detector.window) * _timer
+        curr_average, _noise = sample_mean(_steady)
+        self.uncertainty.setdefault(coil, {})['current_noise'] = float(_noise)
+        return float(curr_average), _settle_time
+
+    # Current first, voltage and field once the current is steady
+    def settle_acquire_coil(self, coil):
+        _results = {}
+        (_curr_meas, _settle_time), _start, _end = timed_measurement(f'Coil {coil} current',
+                                                                     self.coil_curr_settle, coil)
+        _results['current'] = (_curr_meas, _start, _end)
+        _results['voltage'] = timed_measurement(f'Coil {coil} voltage', self.coil_volt_test, coil)
+        # Magnetometer readings buffered by the reader thread since steady state count
+        _since = _settle_time + self.config.settle.magnetometer_delay
+        _results['magnetic field'] = timed_measurement(f'Coil {coil} magnetic field',
+                                                       self.magnet_field_test, coil, _since)
+        return _results
+
+    # Measure coil current, voltage and magnetic field while the coil is energized
+    def acquire_coil(self, coil):
+        if self.config.settle.enabled and not self.fast_current:
+            _results = self.settle_acquire_coil(coil)
+        else:
+            _measurements = {
+                'current': (self.coil_curr_fast if self.fast_current else self.coil_curr_test, (coil,)),
+                'voltage': (self.coil_volt_test, (coil,)),
+                'magnetic field': (self.magnet_field_test, (coil,)),
+            }
+            _results = {}
+            if self.config.concurrent_acquisition:
+                # DAQ970A, 57x8A and FVM-400 are independent instruments, run them in a shared time window
+                with ThreadPoolExecutor(max_workers=len(_measurements),
+                                        thread_name_prefix=f'{self.name} acquire') as _executor:
+                    _futures = {_name: _executor.submit(timed_measurement, f'Coil {coil} {_name}', _func, *_args)
+                                for _name, (_func, _args) in _measurements.items()}
+                    for _name, _future in _futures.items():
+                        _results[_name] = _future.result()
+            else:
+                for _name, (_func, _args) in _measurements.items():
+                    _results[_name] = timed_measurement(f'Coil {coil} {_name}', _func, *_args)
+        for _name, (_value, _start, _end) in _results.items():
+            self.log(f"Coil_{coil} {_name}: {_value}; Start: {format_timestamp(_start)}; "
+                     f"End: {format_timestamp(_end)}; Duration: {_end - _start:.3f} s")
+        return _results['current'][0], _results['voltage'][0], _results['magnetic field'][0]
+
+    def dipole_test(self, coil):
+        _debug = self.config.debug
+        _dipole_moment = 0
+        if coil == 'A':
+            if not _debug:
+                self.v5748A_A_resource.write(':OUTP ON')
+            self.log("Output A enabled")
+            if _debug:
+                _curr_meas = 0.066
+                _volt_meas = 66
+                _magnet_field = 0.0000048
+            else:
+                _curr_meas, _volt_meas, _magnet_field = self.acquire_coil('A')
+            if not _debug:
+                self.v5748A_A_resource.write(':OUTP OFF')
+            self.log("Output A disabled")
+            _dipole_moment = self.calculate_dipole_moment('A', _volt_meas, _curr_meas, float(_magnet_field),
+                                                          self.r0_a, self.t0_a)
+            self.store_measurements('A', {'voltage': _volt_meas, 'current': _curr_meas, 'field': float(_magnet_field)})
+            if self.fast_current:
+                self.test_measurements['A']['current_statistics'] = self.current_statistics.get('A')
+                if self.config.fast_mode.waveform_on_fail and \
+                        not self.passes('A', self.rounded(_dipole_moment), self.config.limits.dipole_moment_a_min):
+                    self.capture_failure_waveform('A', self.v5748A_A_resource)
+        if coil == 'B':
+            if not _debug:
+                self.v5748A_B_resource.write(':OUTP ON')
+            self.log("Output B enabled")
+            if _debug:
+                _curr_meas = 0.0530973451327434
+                _volt_meas = 66
+                _magnet_field = 0.0000040
+            else:
+                _curr_meas, _volt_meas, _magnet_field = self.acquire_coil('B')
+            if not _debug:
+                self.v5748A_B_resource.write(':OUTP OFF')
+            self.log("Output B disabled")
+            _dipole_moment = self.calculate_dipole_moment('B', _volt_meas, _curr_meas, float(_magnet_field),
+                                                          self.r0_b, self.t0_b)
+            self.store_measurements('B', {'voltage': _volt_meas, 'current': _curr_meas, 'field': float(_magnet_field)})
+            if self.fast_current:
+                self.test_measurements['B']['current_statistics'] = self.current_statistics.get('B')
+                if self.config.fast_mode.waveform_on_fail and \
+                        not self.passes('B', self.rounded(_dipole_moment), self.config.limits.dipole_moment_b_min):
+                    self.capture_failure_waveform('B', self.v5748A_B_resource)
+        if coil == 'AB':
+            if not _debug:
+                self.v5748A_A_resource.write(':OUTP ON')
+            self.log("Output A enabled")
+            if not _debug:
+                self.v5748A_B_resource.write(':OUTP ON')
+            self.log("Output B enabled")
+            if _debug:
+                _magnet_field = 0.000006
+            else:
+                _magnet_field = self.magnet_field_test('AB')
+            if not _debug:
+                self.v5748A_A_resource.write(':OUTP OFF')
+            self.log("Output A disabled")
+            if not _debug:
+                self.v5748A_B_resource.write(':OUTP OFF')
+            self.log("Output B disabled")
+            _dipole_moment = self.calculate_dipole_moment('AB', 99, 99, float(_magnet_field), self.r0_a, self.t0_a)
+            self.store_measurements('AB', {'field': float(_magnet_field)})
+        return self.rounded(_dipole_moment)
+
+    # Coil measurements for the report, archive and checkpoint, with the steady
+    # index and moment interval when there are any
+    def store_measurements(self, coil, measurements):
+        if coil in self.steady_index:
+            # Reprocessing averages the same readings
+            measurements['steady_index'] = self.steady_index[coil]
+        if 'std' in self.uncertainty.get(coil, {}):
+            # A copy, a failure waveform captured afterwards does not change it
+            measurements['uncertainty'] = dict(self.uncertainty[coil])
+        self.test_measurements[coil] = measurements
+
+    # Guard banded with Uncertainty.Guard_Band: the lower bound of the moment
+    # interval, not the moment, has to meet the limit
+    def passes(self, coil, moment, limit):
+        _uncertainty = self.test_measurements.get(coil, {}).get('uncertainty')
+        if self.config.uncertainty.guard_band and _uncertainty is not None:
+            return self.rounded(_uncertainty['low']) >= limit
+        return float(moment) >= limit
+
+    # Moment interval for the report line, empty without uncertainty
+    def interval_text(self, coil):
+        _uncertainty = self.test_measurements.get(coil, {}).get('uncertainty')
+        if _uncertainty is None:
+            return ''
+        return (f"\t{100 * _uncertainty['confidence']:g}% Interval: {self.rounded(_uncertainty['low'])} to "
+                f"{self.rounded(_uncertainty['high'])}")
+
+    # Results are rounded before the limit check
+    def rounded(self, moment):
+        return round(moment, self.config.constants.decimals)
+
+    def save_waveform(self, waveform_file_path, time_data, curr_data):
+        # Formatting runs on the writer thread
+        self.file_writer.write(waveform_file_path, functools.partial(format_waveform, time_data, curr_data))
+
+    # Write the Chrome trace of one loop and log where the time went. Stations
+    # share the tracer: only this station's threads (its own, and the reader,
+    # acquisition and report threads named after it) are taken
+    def save_trace(self, date, loop_start):
+        tracer.record(f'Loop {self.loop + 1}', 'loop', loop_start, time.perf_counter())
+        _thread = threading.current_thread().name
+        _events, _threads = tracer.reset(lambda name: name == _thread or name.startswith(f'{self.name} '))
+        _trace_file_path = os.path.join(self.log_path, f"{self.sn}_trace_{date}.json")
+        tracer.write_chrome_trace(_trace_file_path, _events, _threads)
+        _summary = tracer.summary(_events, _threads)
+        self.print('\n'.join(_summary))
+        self.log_lines(_summary)
+        self.print(f'Trace file "{_trace_file_path}" saved successfully.')
+
+    # Create Test Report, returns "PASS" or "FAIL"
+    @tracer.traced('report')
+    def save_txt_report(self, results):
+        config = self.config
+        sn = self.sn
+        _fail_count = 0
+        # build report header
+        name = config.name
+        version = config.version
+        copy_right = config.copyright
+        test_date_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        report_header = f"Test: {name}\nVersion: {version}\nCopyright:{copy_right}\n\nTest Date/Time: {test_date_time}\n\nSN: {sn}\n\n"
+        _csv_header = f"{name},{sn},{version},{test_date_time},"
+
+        # build report body
+        test_limit_lo = config.limits.dipole_moment_a_min
+        if self.passes('A', results[0], test_limit_lo):
+            _pass_fail = "Pass"
+        else:
+            _pass_fail = "Fail"
+            _fail_count += 1
+        _coil_results = [dict(self.test_measurements.get('A', {}), coil='A', moment=results[0], limit_lo=test_limit_lo, pass_fail=_pass_fail)]
+        report_test_a = f'Coil A Dipole Moment Target: {results[0]}\tLower Limit: {test_limit_lo:g}\tUnit: Am2\t{_pass_fail}{self.interval_text("A")}\n'
+        csv_report_test_a = f'{results[0]},{test_limit_lo:g},{_pass_fail},'
+        test_limit_lo = config.limits.dipole_moment_b_min
+        if self.passes('B', results[1], test_limit_lo):
+            _pass_fail = "Pass"
+        else:
+            _pass_fail = "Fail"
+            _fail_count += 1
+        _coil_results.append(dict(self.test_measurements.get('B', {}), coil='B', moment=results[1], limit_lo=test_limit_lo, pass_fail=_pass_fail))
+        report_test_b = f'Coil B Dipole Moment Target: {results[1]}\tLower Limit: {test_limit_lo:g}\tUnit: Am2\t{_pass_fail}{self.interval_text("B")}\n'
+        csv_report_test_b = f'{results[1]},{test_limit_lo:g},{_pass_fail},'
+        test_limit_lo = config.limits.dipole_moment_ab_min
+        if self.passes('AB', results[2], test_limit_lo):
+            _pass_fail = "Pass"
+        else:
+            _pass_fail = "Fail"
+            _fail_count += 1
+        _coil_results.append(dict(self.test_measurements.get('AB', {}), coil='AB', moment=results[2], limit_lo=test_limit_lo, pass_fail=_pass_fail))
+        report_test_ab = f'Coil A&B Dipole Moment: {results[2]}\tLower Limit: {test_limit_lo:g}\tUnit: Am2\t{_pass_fail}{self.interval_text("AB")}\n'
+        csv_report_test_ab = f'{results[2]},{test_limit_lo:g},{_pass_fail},'
+
+        report_body = report_test_a + report_test_b + report_test_ab
+        _csv_body = csv_report_test_a + csv_report_test_b + csv_report_test_ab
+        # build report footer
+        if _fail_count <= 0:
+            report_footer = '\nOverall Result: PASS\n'
+            _csv_footer = 'PASS\n'
+            report_footer_dis = '\033[32m' + '\nOverall Result: Pass\n'
+        else:
+            report_footer = '\nOverall Result: FAIL\n'
+            _csv_footer = 'FAIL\n'
+            report_footer_dis = '\033[31m' + '\nOverall Result: Fail\n'
+            #\033[31mThis is red text\033[0m
+        report = report_header + report_body + report_footer
+        csv_report = _csv_header + _csv_body + _csv_footer
+        report_dis = report_header + report_body + report_footer_dis
+        self.print(report_dis)
+        # Save test report
+        txt_file_path = os.path.join(self.log_path, f"{sn}_test_report_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.txt")
+        with open(txt_file_path, "a") as file:
+            file.write(report)
+            self.print('\033[37m' + f'TXT file "{txt_file_path}" saved successfully.')
+
+        _csv_file_path = "test_data.csv"
+        with _csv_lock, open(_csv_file_path, "a") as file:
+            file.write(csv_report)
+            self.print(f'CSV file "{_csv_file_path}" saved successfully.')
+
+        if self.results_db is not None:
+            _run = {'name': name, 'version': version, 'sn': sn, 'test_time': test_date_time,
+                    'overall': 'PASS' if _fail_count <= 0 else 'FAIL', 'loop': self.loop + 1,
+                    't0_a': self.t0_a, 'r0_a': self.r0_a, 't0_b': self.t0_b, 'r0_b': self.r0_b,
+                    'log_file': self.log_file_path, 'report_file': txt_file_path, 'source': 'live'}
+            _waveforms = {}
+            if config.waveform_csv and not config.debug:
+                # Fast mode loops only have the waveforms of failing coils
+                _waveforms.update({_coil: _path for _coil, _path in (('A', self.waveform_file_path_A),
+                                                                    ('B', self.waveform_file_path_B))
+                                   if f'current_{_coil}' in self.run_arrays})
+            if config.run_archive:
+                _waveforms['archive'] = self.run_archive_path
+            self.results_db.add_run(_run, _coil_results, _waveforms)
+            self.print(f'Results saved to "{self.results_db.path}".')
+        return 'PASS' if _fail_count <= 0 else 'FAIL'
+
+    # Save waveforms, magnetometer samples, log and metadata of the run in one binary file
+    @tracer.traced('report')
+    def save_run_archive(self, results):
+        config = self.config
+        _metadata = {
+            'name': config.name,
+            'version': config.version,
+            'station': self.name,
+            'sn': self.sn,
+            'test_time': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'loop': self.loop + 1,
+            'calibration': {'T0_A': self.t0_a, 'R0_A': self.r0_a, 'T0_B': self.t0_b, 'R0_B': self.r0_b},
+            'sample_interval': {coil: config.equipment.daq_digitize(coil).interval for coil in ('A', 'B')},
+            'results': dict(zip(('A', 'B', 'AB'), results)),
+            'limits': {coil: config.limits.minimum(coil) for coil in ('A', 'B', 'AB')},
+            # As decided by the report, guard banded or not
+            'pass_fail': {coil: 'Pass' if self.passes(coil, result, config.limits.minimum(coil)) else 'Fail'
+                          for coil, result in zip(('A', 'B', 'AB'), results)},
+            'measurements': self.test_measurements,
+            'magnetometer_baseline': self.fvm400.baseline,
+            'config': config.raw,
+        }
+        # The log is written by the background writer, make it complete first
+        self.file_writer.flush()
+        _arrays = dict(self.run_arrays)
+        with open(self.log_file_path, 'rb') as file:
+            _arrays['log'] = numpy.frombuffer(file.read(), dtype=numpy.uint8)
+        write_run_archive(self.run_archive_path, _metadata, _arrays, compress=config.run_archive_compress)
+        self.print(f'Run archive "{self.run_archive_path}" saved successfully.')
+
+    # One complete test of the DUT: instruments, three dipole tests, reports
+    def run_loop(self):
+        config = self.config
+        test_data = []
+        self.test_measurements = {}
+        self.run_arrays = {}
+        self.current_statistics = {}
+        self.uncertainty = {}
+        self.steady_index = {}
+        # Fast mode digitizes full waveforms only on every Waveform_Every-th unit of the
+        # station, counted across DUTs since production runs one loop per DUT
+        _waveform_every = config.fast_mode.waveform_every
+        self.fast_current = config.fast_mode.enabled and not config.debug and \
+            not (_waveform_every > 0 and self.units_started % _waveform_every == 0)
+        self.units_started += 1
+        _loop_start = time.perf_counter()
+        # Create log file
+        self.log_path = os.path.join(os.getcwd(), self.sn)
+        os.makedirs(self.log_path, exist_ok=True)
+        # Loops can start within the same second, the loop number keeps the files of every loop apart
+        _date = datetime.datetime.now().strftime("%Y%m%d_%H%M%S") + f"_loop{self.loop + 1}"
+        self.log_file_path = os.path.join(self.log_path, f"{self.sn}_data_log_{_date}.txt")
+        # Log file title
+        self.log(config.log_title)
+        self.log(self.sn)
+        self.log(f'Station: {self.name}')
+        self.log(f'Loop#: {self.loop + 1}')
+        self.log(f"T0_A={self.t0_a}; R0_A={self.r0_a}; T0_B={self.t0_b}; R0_B={self.r0_b}")
+        if config.fast_mode.enabled:
+            self.log('Current: on-instrument averaging' if self.fast_current else 'Current: full waveform')
+        self.log('load Configuration')
+        self.log_lines(str(config.raw).split(','))
+        # Build waveform file path
+        self.waveform_file_path_A = os.path.join(self.log_path, f"{self.sn}_coil_A_current_waveform{_date}.csv")
+        self.waveform_file_path_B = os.path.join(self.log_path, f"{self.sn}_coil_B_current_waveform{_date}.csv")
+        self.run_archive_path = os.path.join(self.log_path, f"{self.sn}_run_{_date}.dra")
+
+        if not config.debug:
+            # Config Power Supply
+            self.v5748A_A_resource = self.open_n5748a('A')
+            self.config_n5748a('A', self.v5748A_A_resource)
+            self.v5748A_B_resource = self.open_n5748a('B')
+            self.config_n5748a('B', self.v5748A_B_resource)
+
+            # Config DAQ Configuration
+            self.daq970A_resource = self.open_daq970a(config.equipment.daq_resource_name)
+
+            # Configure the Magnetometer Serial Port
+            self.magnetometer_session = self.open_serial()
+            self.start_magnetometer_reader()
+            if config.equipment.magnetometer_baseline:
+                self.capture_magnetometer_baseline()
+
+        # Sub-tests finished before an interrupted batch stopped are not repeated
+        _restored = self.checkpoint.completed(self.run_key()) if self.checkpoint is not None else {}
+        # Test #1 - Coil A Dipole Test
+        test_data.append(self.run_test(1, 'A', _restored))
+        # Test #2 - Coil B Dipole Test
+        test_data.append(self.run_test(2, 'B', _restored))
+        # Test #3 - Coil A & B Dipole Test
+        test_data.append(self.run_test(3, 'AB', _restored))
+
+        self.print(test_data)
+        if self.report_executor is not None:
+            # Soak: loop N reports on a snapshot of its state while loop N+1 acquires,
+            # at most one report in flight
+            if tracer.enabled:
+                self.save_trace(_date, _loop_start)
+            self.wait_for_report()
+            self._pending_report = self.report_executor.submit(copy.copy(self).save_reports, test_data,
+                                                               time.perf_counter() - _loop_start)
+            if config.loop_number > 1:
+                tracer.sleep(config.loop_delay, 'Loop_Delay')
+        else:
+            # Create Test Report
+            _overall = self.save_reports(test_data)
+            self.cycles.append((self.loop + 1, _overall, time.perf_counter() - _loop_start))
+            if config.loop_number > 1:
+                tracer.sleep(config.loop_delay, 'Loop_Delay')
+            if tracer.enabled:
+                self.save_trace(_date, _loop_start)
+            self.file_writer.release(self.log_file_path, self.waveform_file_path_A, self.waveform_file_path_B)
+        self.print(f'Loop Number: {self.loop + 1}')
+
+    def run_test(self, number, coil, restored):
+        self.print(f'Dipole Test #{number}')
+        self.log(f'Test #{number}')
+        if coil in restored:
+            self.test_measurements[coil] = restored[coil]['measurements']
+            self.print(f"Coil {coil} restored from checkpoint: {restored[coil]['moment']}")
+            self.log(f"Coil_{coil} restored from checkpoint: {restored[coil]['moment']}")
+            return restored[coil]['moment']
+        with tracer.span(f'Test #{number} Coil {coil}', 'dipole_test', station=self.name):
+            if not self.config.debug and coil != 'AB':
+                self.config_daq970a(self.daq970A_resource, coil)
+            _moment = self.dipole_test(coil)
+        if self.checkpoint is not None:
+            self.checkpoint.record(self.run_key(), coil, _moment, self.test_measurements.get(coil, {}))
+        return _moment
+
+    def run_key(self):
+        return self.checkpoint.key(self.job_source, self.sn, self.loop)
+
+    # TXT/CSV report, results database and run archive of the loop, returns "PASS" or "FAIL".
+    # In soak mode this runs on the report thread with "cycle_time" of the acquisition.
+    def save_reports(self, test_data, cycle_time=None):
+        _overall = self.save_txt_report(test_data)
+        if self.config.run_archive:
+            self.save_run_archive(test_data)
+        if self.soak_statistics is not None:
+            _measurements = {_coil: dict(self.test_measurements.get(_coil, {}), moment=_moment)
+                             for _coil, _moment in zip(('A', 'B', 'AB'), test_data)}
+            self.soak_statistics.add(time.time(), _measurements, _overall)
+            _every = self.config.soak.statistics_every
+            if _every > 0 and self.soak_statistics.loops % _every == 0:
+                _lines = self.soak_statistics.lines()
+                self.print('\n'.join(_lines))
+                self.log_lines(_lines)
+        if self.checkpoint is not None:
+            self.checkpoint.finish(self.run_key(), _overall)
+        if cycle_time is not None:
+            self.cycles.append((self.loop + 1, _overall, cycle_time))
+            self.file_writer.release(self.log_file_path, self.waveform_file_path_A, self.waveform_file_path_B)
+        return _overall
+
+    # Re-raises an error of the report in flight
+    def wait_for_report(self):
+        if self._pending_report is not None:
+            _pending, self._pending_report = self._pending_report, None
+            _pending.result()
+
+    # Final soak statistics, printed and saved next to the logs
+    def save_soak_summary(self):
+        _lines = self.soak_statistics.lines()
+        self.print('\n'.join(_lines))
+        if self.log_path is None:
+            return
+        _date = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        _summary_file_path = os.path.join(self.log_path, f"{self.sn}_soak_summary_{_date}.txt")
+        self.file_writer.write(_summary_file_path, '\n'.join(_lines) + '\n')
+        self.file_writer.release(_summary_file_path)
+        self.print(f'Soak summary "{_summary_file_path}" saved successfully.')
+
+    # The DUT entered at startup, or the next jobs of the batch queue
+    def next_duts(self, jobs):
+        if jobs is None:
+            yield
+            return
+        while (_job := jobs.next()) is not None:
+            self.sn = _job.sn
+            self.t0_a, self.r0_a, self.t0_b, self.r0_b = _job.t0_a, _job.r0_a, _job.t0_b, _job.r0_b
+            self.job_source = _job.source
+            self.print(f"{self.sn}; T0_A:{self.t0_a}; R0_A:{self.r0_a}; T0_B:{self.t0_b}; R0_B:{self.r0_b}; "
+                       f"{len(jobs)} DUTs left in queue")
+            yield
+
+    # All loops of this station, a station that stops (exit() on an instrument
+    # error) does not stop the others
+    def run(self, jobs=None):
+        self.start_time = time.perf_counter()
+        if self.config.soak.enabled:
+            self.report_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{self.name} report')
+        try:
+            for _dut in self.next_duts(jobs):
+                self.duts.append(self.sn)
+                if self.report_executor is not None:
+                    # Repeatability statistics are per DUT
+                    self.soak_statistics = SoakStatistics()
+                for _loop in range(self.config.loop_number):
+                    self.loop = _loop
+                    if self.checkpoint is not None and self.checkpoint.done(self.run_key()):
+                        self.print(f'{self.sn} loop {_loop + 1} already tested, skipped')
+                        continue
+                    try:
+                        self.run_loop()
+                    finally:
+                        if self.report_executor is None:
+                            self.file_writer.flush()
+                        self.print('End of Dipole Test.')
+                if self.soak_statistics is not None:
+                    # The report of the last loop adds to the statistics
+                    self.wait_for_report()
+                    if self.soak_statistics.loops > 0:
+                        self.save_soak_summary()
+                    self.soak_statistics = None
+            self.wait_for_report()
+        except SystemExit:
+            self.error = 'stopped on instrument error'
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+            self.print(traceback.format_exc())
+        finally:
+            if self.report_executor is not None:
+                self.report_executor.shutdown()
+                if self.soak_statistics is not None and self.soak_statistics.loops > 0:
+                    self.save_soak_summary()
+            self.file_writer.flush()
+            self.end_time = time.perf_counter()
+            self.close()
+        if self.error is not None:
+            self.print(f'Station stopped: {self.error}')
+            if self.log_file_path is not None:
+                self.log(f'Station stopped: {self.error}')
+                self.file_writer.flush()
+
+    # Clear Resources
+    def close(self):
+        # Never leave a coil energized, whatever stopped the station
+        for _coil, _resource in (('A', self.v5748A_A_resource), ('B', self.v5748A_B_resource)):
+            if _resource is None:
+                continue
+            try:
+                _resource.write(':OUTP OFF')
+                self.log(f"Output {_coil} disabled")
+            except Exception as e:
+                self.print(f"Error: Could not disable output {_coil}. {e}")
+        if self.magnetometer_reader is not None:
+            self.magnetometer_reader.stop()
+        self.instrument_pool.close_all()
+
+    # Tested, passed, station time and units per hour
+    def throughput(self):
+        _elapsed = self.end_time - self.start_time
+        _tested = len(self.cycles)
+        _passed = sum(1 for _loop, _overall, _cycle in self.cycles if _overall == 'PASS')
+        _mean_cycle = sum(_cycle for _loop, _overall, _cycle in self.cycles) / _tested if _tested else 0.0
+        # A batch station that got no job has no SN
+        _sn = (self.sn or '-') if len(self.duts) <= 1 else f'{len(self.duts)} DUTs'
+        return {'station': self.name, 'sn': _sn, 'tested': _tested, 'passed': _passed, 'elapsed': _elapsed,
+                'mean_cycle': _mean_cycle, 'units_per_hour': 3600.0 * _tested / _elapsed if _elapsed > 0 else 0.0,
+                'error': self.error}
+
+
+# Run one measurement and record its start/end time
+def timed_measurement(name, func, *args):
+    with tracer.span(name, 'measure'):
+        _start = time.time()
+        _value = func(*args)
+        _end = time.time()
+    return _value, _start, _end
+
+
+def format_timestamp(t):
+    return datetime.datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def format_waveform(time_data, curr_data):
+    _text = io.StringIO()
+    numpy.savetxt(_text, numpy.column_stack((time_data, curr_data)), fmt=('%.6f', '%.9E'), delimiter=',')
+    return _text.getvalue()
+
+
+# Run every station on its own thread, returns the combined throughput summary lines.
+# Instrument I/O releases the GIL, and threads share the log writer, results database
+# and tracer, so there is no process pool.
+# "jobs" is the JobQueue of a batch, shared by the stations
+def run_stations(stations, jobs=None):
+    _start = time.perf_counter()
+    if len(stations) == 1:
+        stations[0].run(jobs=jobs)
+    else:
+        # One VISA resource manager for all stations, closed once every station has finished
+        _resource_manager_pool = InstrumentPool()
+        for _station in stations:
+            _station.instrument_pool.share_resource_manager(_resource_manager_pool)
+        _threads = [threading.Thread(target=_station.run, kwargs={'jobs': jobs},
+                                     name=_station.name)
+                    for _station in stations]
+        for _thread in _threads:
+            _thread.start()
+        for _thread in _threads:
+            _thread.join()
+        _resource_manager_pool.close_all()
+    _wall = time.perf_counter() - _start
+    _rows = [_station.throughput() for _station in stations]
+    _tested = sum(_row['tested'] for _row in _rows)
+    _lines = [f"{'Station':<12} {'SN':<10} {'Tested':>6} {'Passed':>6} {'Mean cycle':>10} {'Units/h':>8}  Status"]
+    for _row in _rows:
+        _lines.append(f"{_row['station']:<12} {_row['sn']:<10} {_row['tested']:>6} {_row['passed']:>6} "
+                      f"{_row['mean_cycle']:>9.1f}s {_row['units_per_hour']:>8.1f}  {_row['error'] or 'OK'}")
+    _lines.append(f'Total: {_tested} tested, {sum(_row["passed"] for _row in _rows)} passed in {_wall:.1f} s, '
+                  f'{3600.0 * _tested / _wall if _wall > 0 else 0.0:.1f} units/h')
+    return _lines
@@ -0,0 +1,140 @@
+# Timing spans and trace export
+# Spans are recorded as Chrome trace "complete" events (chrome://tracing or
+# https://ui.perfetto.dev) and summarized per category and name.
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self._events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    # Record a span from perf_counter() start/end times
+    def record(self, name, category, start, end, **args):
+        if not self.enabled:
+            return
+        _thread = threading.current_thread()
+        _event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self._origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': _thread.ident,
+        }
+        if args:
+            _event['args'] = {k: str(v) for k, v in args.items()}
+        with self._lock:
+            self._events.append(_event)
+            self._threads[_thread.ident] = _thread.name
+
+    @contextlib.contextmanager
+    def span(self, name, category, **args):
+        if not self.enabled:
+            yield
+            return
+        _start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, category, _start, time.perf_counter(), **args)
+
+    # Decorator form of span
+    def traced(self, category, name=None):
+        def decorator(func):
+            _name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(_name, category):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def sleep(self, seconds, name='sleep'):
+        with self.span(name, 'sleep'):
+            time.sleep(seconds)
+
+    # Return the recorded events and start a new trace, "thread_filter" takes
+    # only the events of the threads whose name it accepts and keeps the others
+    def reset(self, thread_filter=None):
+        with self._lock:
+            if thread_filter is None:
+                _events, self._events = self._events, []
+                _threads, self._threads = self._threads, {}
+            else:
+                _threads = {tid: name for tid, name in self._threads.items() if thread_filter(name)}
+                _events = [e for e in self._events if e['tid'] in _threads]
+                self._events = [e for e in self._events if e['tid'] not in _threads]
+                for _tid in _threads:
+                    del self._threads[_tid]
+        return _events, _threads
+
+    @staticmethod
+    def write_chrome_trace(path, events, threads):
+        _metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                     for tid, name in threads.items()]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': _metadata + events, 'displayTimeUnit': 'ms'}, file)
+
+    # Exclusive time of every span: its duration minus the nested spans of the
+    # same thread, so a loop span only keeps the time nothing else accounts for
+    @staticmethod
+    def self_times(events):
+        _self = [e['dur'] / 1e6 for e in events]
+        _by_thread = {}
+        for _index, _event in enumerate(events):
+            _by_thread.setdefault(_event['tid'], []).append(_index)
+        for _indexes in _by_thread.values():
+            _indexes.sort(key=lambda i: (events[i]['ts'], -events[i]['dur']))
+            _stack = []
+            for _index in _indexes:
+                _start = events[_index]['ts']
+                _end = _start + events[_index]['dur']
+                while _stack and events[_stack[-1]]['ts'] + events[_stack[-1]]['dur'] <= _start:
+                    _stack.pop()
+                if _stack:
+                    _parent = events[_stack[-1]]
+                    _self[_stack[-1]] -= (min(_end, _parent['ts'] + _parent['dur']) - _start) / 1e6
+                _stack.append(_index)
+        return _self
+
+    # Where time went: exclusive time per thread and category (each thread adds
+    # up to at most the wall time, background threads such as the FVM-400
+    # reader are listed on their own), then the slowest span names.
+    @staticmethod
+    def summary(events, threads=None, top=10):
+        if not events:
+            return ['No timing data']
+        _threads = threads or {}
+        _wall = (max(e['ts'] + e['dur'] for e in events) - min(e['ts'] for e in events)) / 1e6
+        _categories = {}
+        _names = {}
+        for _event, _self in zip(events, Tracer.self_times(events)):
+            _duration = _event['dur'] / 1e6
+            _thread = _categories.setdefault(_event['tid'], {})
+            _thread[_event['cat']] = _thread.get(_event['cat'], 0.0) + _self
+            _count, _total, _max = _names.get((_event['cat'], _event['name']), (0, 0.0, 0.0))
+            _names[(_event['cat'], _event['name'])] = (_count + 1, _total + _duration, max(_max, _duration))
+        _lines = [f'Timing summary: wall {_wall:.3f} s']
+        for _tid, _thread in sorted(_categories.items(), key=lambda t: -sum(t[1].values())):
+            _lines.append(f'  Thread {_threads.get(_tid, _tid)} (self time):')
+            for _category, _total in sorted(_thread.items(), key=lambda c: -c[1]):
+                _lines.append(f'    {_category:<12} {_total:9.3f} s {100 * _total / _wall:6.1f} %')
+        _lines.append(f'  Top {top} spans (count, total, mean, max):')
+        for (_category, _name), (_count, _total, _max) in sorted(_names.items(), key=lambda n: -n[1][1])[:top]:
+            _lines.append(f'  {_category:<12} {_name[:40]:<40} {_count:5d} {_total:9.3f} s '
+                          f'{1000 * _total / _count:9.3f} ms {1000 * _max:9.3f} ms')
+        return _lines
+
+tracer = Tracer()